@@ -5,7 +5,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'dev-secret-key-change-me'
 
-DEBUG = True
+DEBUG = os.getenv('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = ['*']
 
@@ -20,7 +20,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it compresses the final body after every other middleware ran
+    'store.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -35,13 +38,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process; runserver still reloads on edits
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.fragments',
+                'store.context_processors.assets',
             ],
         },
     },
@@ -49,13 +60,49 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'gamestore.wsgi.application'
 
+# Fragment caches ({% cache %}) live here; point REDIS_URL at a shared cache in production
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gamestore',
+    }
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Seconds rendered game cards and chat bubbles stay in the fragment cache
+TEMPLATE_FRAGMENT_TTL = 10 * 60
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # take the write lock at BEGIN (Django 5.1+): concurrent checkouts then wait on the busy
+        # timeout instead of failing with "database is locked" when a read upgrades to a write
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # a file, not shared-cache memory, so tests with concurrent threads see real locking
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICAS=replica.sqlite3 locally (refresh it with
+# `manage.py sync_replica`). Safe reads go to a healthy replica; writes, transactions,
+# admin, and a client's requests right after its own POST stay on the primary.
+for _i, _name in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{_i}'] = {
+        'ENGINE': DATABASES['default']['ENGINE'],
+        'NAME': BASE_DIR / _name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+REPLICA_HEALTH_INTERVAL = 5
+REPLICA_MAX_LAG = 30
+# a client reads its own writes only once no serving replica can be further behind
+REPLICA_STICKY_SECONDS = REPLICA_MAX_LAG
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -83,11 +130,87 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        # hashed filenames so the web server can send far-future Cache-Control headers
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+    },
+}
+
+# Asset pipeline (python manage.py build_assets)
+TAILWIND_CLI = os.getenv('TAILWIND_CLI', 'tailwindcss')
+HTMX_VERSION = '1.9.12'
+# Serve the compiled stylesheet and vendored htmx instead of the CDN runtime. Off by default
+# until build_assets --collect has written the manifest, whose lookups would otherwise fail
+# (see the store.W001 check)
+USE_BUILT_ASSETS = os.getenv(
+    'USE_BUILT_ASSETS', '1' if not DEBUG and (STATIC_ROOT / 'staticfiles.json').exists() else '0',
+) == '1'
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Local WebP thumbnails for external Game.image URLs (needs Pillow)
+IMAGE_PROXY_ENABLED = os.getenv('IMAGE_PROXY_ENABLED', '1') == '1'
+IMAGE_PROXY_WIDTHS = (320, 640, 1280)
+IMAGE_CACHE_ROOT = MEDIA_ROOT / 'img-cache'
+# browser/CDN lifetime of a proxied image; refresh_images re-renders at the same URL
+IMAGE_PROXY_MAX_AGE = 24 * 3600
+# after a failed fetch, requests redirect to the original for this long before trying again
+IMAGE_PROXY_RETRY_SECONDS = 5 * 60
+
+# Seconds a cart line holds its stock reservation
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Related games kept per game by refresh_recommendations
+RECOMMENDATIONS_TOP_K = 8
+
+# Flag a game for `backfill_partial_orders --loop` when a credential is added to its pool
+BACKFILL_ON_RESTOCK = True
+
+# 'queued' makes checkout only record the order; process_checkout_queue workers allocate and email it
+CHECKOUT_MODE = os.getenv('CHECKOUT_MODE', 'sync')
+
+# Staff chat digests: sent once a thread is quiet this long, or at most this long after its first message
+CHAT_NOTIFY_QUIET_SECONDS = 120
+CHAT_NOTIFY_MAX_DELAY = 600
+
+# Chat and badge polls: the server suggests each next delay (X-Poll-After, store/polling.py) within
+# these bounds; background tabs wait at least POLL_HIDDEN_SECONDS
+POLL_MIN_SECONDS = 2
+POLL_MAX_SECONDS = 60
+POLL_HIDDEN_SECONDS = 60
+
+# Largest chat attachment; enforced while the upload streams in (store/uploads.py)
+CHAT_UPLOAD_MAX_BYTES = 5 * 1024 * 1024
+
+# compact_events keeps order events this long (and never drops unread ones)
+ORDER_EVENT_RETENTION_DAYS = 90
+
+# /metrics: bearer token required when set; without one it answers only under DEBUG or with
+# METRICS_PUBLIC=1. METRICS_DIR makes workers share counters through files
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', '0') == '1'
+# label sets per metric and process before new ones (e.g. more games) count as "other"
+METRICS_MAX_SERIES = int(os.getenv('METRICS_MAX_SERIES', '50'))
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+# Token-bucket limits for public POST endpoints (store/throttling.py); override a scope e.g.
+# THROTTLE_RATES = {'purchases_email': '5/h'}. THROTTLE_STORE = 'memory' keeps buckets per process.
+THROTTLE_ENABLED = True
+THROTTLE_STORE = 'cache'
+THROTTLE_RATES = {}
+THROTTLE_TRUST_X_FORWARDED_FOR = os.getenv('THROTTLE_TRUST_X_FORWARDED_FOR', '0') == '1'
+
+# Absolute base URL for links in emails sent outside a request (backfill, jobs)
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
+
 # Email: console backend for development
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'store@example.com'
@@ -6,3 +6,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gamestore.settings')
 
 application = get_wsgi_application()
 
+if os.getenv('WARMUP_ON_START') == '1':
+    # compile templates and prime caches before the first request (with gunicorn --preload,
+    # once in the master so forked workers share the result)
+    from store.warmup import warm
+    warm()
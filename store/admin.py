@@ -1,26 +1,103 @@
-from django.contrib import admin
-from django.db.models import Max, Count, Q
-from .models import Game, Order, OrderItem, GameCredential, OfflineCredentialAssignment, DeliveryLink, EmailAccessLink, ChatMessage, OrderChat
+from django.contrib import admin, messages
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_protect
+from django.db.models import Max, Count, Exists, IntegerField, OuterRef, Q, Subquery, Sum, F, DecimalField, Value
+from django.db.models.functions import Coalesce
+from .models import CredentialSnapshot, Customer, Game, Order, OrderItem, GameCredential, OfflineCredentialAssignment, DeliveryLink, EmailAccessLink, ChatMessage, OrderChat, OrderEvent
+from . import credentials, customers, events, metrics, polling, uploads
+from .forms import GameImportForm, OfflineCredentialAssignmentForm
+from .importer import detect_format, import_games, read_rows
+from .paginators import EstimatedCountPaginator
+from .views import chat_partial
+
+
+class ScalableAdminMixin:
+    """Changelist settings for tables that grow to millions of rows.
+
+    Skips the second COUNT(*) for the unfiltered total, estimates large unfiltered counts,
+    and replaces icontains scans with index-friendly searches: prefix match on
+    `prefix_search_fields` and exact match on `exact_search_fields`. Email fields are stored
+    lowercase, so only they get a lowercased term; usernames are matched as typed.
+    """
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    prefix_search_fields = ()
+    exact_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        q = Q()
+        for field in self.prefix_search_fields:
+            value = term.lower() if field.split('__')[-1] == 'email' else term
+            q |= Q(**{f'{field}__startswith': value})
+        for field in self.exact_search_fields:
+            if (field == 'id' or field.endswith('__id')) and not term.isdigit():
+                continue
+            q |= Q(**{field: term})
+        return queryset.filter(q), False
 
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category', 'price', 'original_price', 'slug')
+    list_display = ('title', 'category', 'price', 'original_price', 'slug', 'stock_available', 'stock_assigned', 'stock_reserved')
     search_fields = ('title',)
     list_filter = ('category',)
     prepopulated_fields = {"slug": ("title",)}
+    change_list_template = 'admin/store/game/change_list.html'
+
+    def get_urls(self):
+        custom = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='store_game_import'),
+        ]
+        return custom + super().get_urls()
+
+    def import_view(self, request):
+        if not request.user.has_perm('store.add_game'):
+            return redirect('admin:store_game_changelist')
+        form = GameImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or detect_format(upload.name)
+            try:
+                stats = import_games(read_rows(upload, fmt))
+            except (ValueError, KeyError) as exc:
+                self.message_user(request, f'Import failed: {exc}', messages.ERROR)
+            else:
+                self.message_user(request, f'Import finished: {stats.summary()}', messages.SUCCESS)
+                for line_no, error in stats.errors[:10]:
+                    self.message_user(request, f'Row {line_no}: {error}', messages.WARNING)
+                return redirect('admin:store_game_changelist')
+        return render(request, 'admin/store/game/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Import games',
+        })
 
 
 @admin.register(GameCredential)
-class GameCredentialAdmin(admin.ModelAdmin):
+class GameCredentialAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    # filter by game with ?game__id__exact=<id>; a sidebar would load every Game
     list_display = ('game', 'username', 'notes')
-    list_filter = ('game',)
-    search_fields = ('username', 'game__title')
+    list_select_related = ('game',)
+    autocomplete_fields = ('game',)
+    search_fields = ('username', 'game__id')
+    search_help_text = 'Username prefix or game ID'
+    prefix_search_fields = ('username',)
+    exact_search_fields = ('game__id',)
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    autocomplete_fields = ('game',)
 
 
 class ChatMessageInline(admin.TabularInline):
@@ -40,60 +117,201 @@ class ChatMessageInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'email', 'created_at', 'status', 'total_amount')
+class OrderAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    # a customer's orders: ?customer__id__exact=<id>, linked from the customer list
+    list_display = ('id', 'email', 'created_at', 'status', 'order_total')
     list_filter = ('status', 'created_at')
-    search_fields = ('email',)
+    raw_id_fields = ('customer',)
+    search_fields = ('email', 'id')
+    search_help_text = 'Email prefix or order ID'
+    prefix_search_fields = ('email',)
+    exact_search_fields = ('id',)
     inlines = [OrderItemInline]
 
+    def get_queryset(self, request):
+        # correlated per row, so the page query needs no JOIN + GROUP BY over every matching order
+        money = DecimalField(max_digits=12, decimal_places=2)
+        totals = (
+            OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+            .annotate(total=Sum(F('unit_price') * F('quantity'), output_field=money)).values('total')
+        )
+        return super().get_queryset(request).annotate(total=Subquery(totals, output_field=money))
+
+    def save_model(self, request, obj, form, change):
+        obj.email = customers.normalize_email(obj.email)
+        # follow the email unless staff picked the customer explicitly
+        if not obj.customer_id or ('email' in form.changed_data and 'customer' not in form.changed_data):
+            obj.customer = customers.customer_for(obj.email)
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            events.record('order.status', obj.pk, old=form.initial.get('status'), new=obj.status, by=request.user.get_username())
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # items and the customer link are saved by now; recount both the old and new customer
+        ids = {form.initial.get('customer'), form.instance.customer_id} - {None}
+        customers.recount(Customer.objects.filter(pk__in=ids))
 
+    def delete_model(self, request, obj):
+        customer_id = obj.customer_id
+        super().delete_model(request, obj)
+        customers.recount(Customer.objects.filter(pk=customer_id))
+
+    def delete_queryset(self, request, queryset):
+        ids = set(queryset.exclude(customer=None).values_list('customer_id', flat=True))
+        super().delete_queryset(request, queryset)
+        customers.recount(Customer.objects.filter(pk__in=ids))
+
+    def order_total(self, obj):
+        return obj.total or 0
+    order_total.admin_order_field = 'total'
+    order_total.short_description = 'Total amount'
+
+
+
+
+@admin.register(Customer)
+class CustomerAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('email', 'order_count', 'lifetime_spend', 'last_order_at', 'has_open_chat', 'order_list')
+    list_filter = ('has_open_chat',)
+    search_fields = ('email',)
+    search_help_text = 'Email prefix'
+    prefix_search_fields = ('email',)
+    ordering = ('-last_order_at',)
+    readonly_fields = ('order_count', 'lifetime_spend', 'last_order_at', 'has_open_chat', 'created_at')
+    actions = ['recount_selected']
+
+    def order_list(self, obj):
+        url = reverse('admin:store_order_changelist') + f'?customer__id__exact={obj.pk}'
+        return format_html('<a href="{}">Orders</a>', url)
+    order_list.short_description = 'Orders'
+
+    @admin.action(description='Recount selected customers from their orders')
+    def recount_selected(self, request, queryset):
+        updated = customers.recount(queryset)
+        self.message_user(request, f'Recounted {updated} customer(s).', messages.SUCCESS)
 
 
 @admin.register(OfflineCredentialAssignment)
-class OfflineCredentialAssignmentAdmin(admin.ModelAdmin):
+class OfflineCredentialAssignmentAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    form = OfflineCredentialAssignmentForm
     list_display = ('order', 'game', 'username', 'created_at')
-    list_filter = ('game', 'created_at')
-    search_fields = ('order__email', 'username')
+    list_filter = ('created_at',)
+    list_select_related = ('order', 'game', 'snapshot')
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('game',)
+    search_fields = ('order__email', 'order__id', 'game__id')
+    search_help_text = 'Customer email prefix, order ID or game ID'
+    prefix_search_fields = ('order__email',)
+    exact_search_fields = ('order__id', 'game__id')
+
+    def save_model(self, request, obj, form, change):
+        # an edit points at another (possibly new) snapshot; the old one stays for other orders
+        content = form.content()
+        obj.snapshot_id = credentials.snapshot_ids([content])[content]
+        super().save_model(request, obj, form, change)
+        if not change:
+            events.record('order.allocated', obj.order_id, game=obj.game_id, quantity=1, by=request.user.get_username())
+
+
+@admin.register(CredentialSnapshot)
+class CredentialSnapshotAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('username', 'notes', 'created_at')
+    search_fields = ('username', 'digest')
+    search_help_text = 'Username prefix or exact digest'
+    prefix_search_fields = ('username',)
+    exact_search_fields = ('digest',)
+
+    # delivered history: shared by many assignments, so never edited in place
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(DeliveryLink)
-class DeliveryLinkAdmin(admin.ModelAdmin):
+class DeliveryLinkAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('order', 'token', 'created_at', 'expires_at')
+    list_select_related = ('order',)
+    raw_id_fields = ('order',)
     search_fields = ('token', 'order__email')
+    search_help_text = 'Exact token or customer email prefix'
+    prefix_search_fields = ('order__email',)
+    exact_search_fields = ('token',)
 
 
 @admin.register(EmailAccessLink)
-class EmailAccessLinkAdmin(admin.ModelAdmin):
+class EmailAccessLinkAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('email', 'token', 'created_at', 'expires_at')
     search_fields = ('email', 'token')
+    search_help_text = 'Email prefix or exact token'
+    prefix_search_fields = ('email',)
+    exact_search_fields = ('token',)
 
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('order', 'sender', 'short_message', 'created_at')
     list_filter = ('sender', 'created_at')
-    search_fields = ('order__email', 'message')
+    list_select_related = ('order',)
+    raw_id_fields = ('order',)
+    search_fields = ('order__email', 'order__id')
+    search_help_text = 'Customer email prefix or order ID'
+    prefix_search_fields = ('order__email',)
+    exact_search_fields = ('order__id',)
 
     def short_message(self, obj):
         return (obj.message[:60] + '…') if len(obj.message) > 60 else obj.message
     short_message.short_description = 'Message'
 
 
+@admin.register(OrderEvent)
+class OrderEventAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'kind', 'order_id', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('order__id',)
+    search_help_text = 'Order ID'
+    exact_search_fields = ('order__id',)
+
+    # append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(OrderChat)
-class ChatOrderAdmin(admin.ModelAdmin):
+class ChatOrderAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'email', 'created_at', 'last_message_at', 'unread_messages')
     search_fields = ('email', 'id')
+    search_help_text = 'Email prefix or order ID'
+    prefix_search_fields = ('email',)
+    exact_search_fields = ('id',)
     change_form_template = 'admin/store/orderchat/change_form.html'
     inlines = []
     fields = []
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.annotate(
-            last_message=Max('chat_messages__created_at'),
-            unread=Count('chat_messages', filter=Q(chat_messages__sender='customer', chat_messages__is_read=False)),
+        # correlated per row like OrderAdmin, so the page needs no JOIN + GROUP BY over all chats
+        messages = ChatMessage.objects.filter(order=OuterRef('pk')).order_by()
+        last = messages.order_by('-created_at').values('created_at')[:1]
+        unread = (
+            messages.filter(sender='customer', is_read=False).values('order')
+            .annotate(n=Count('pk')).values('n')
+        )
+        qs = super().get_queryset(request).filter(Exists(messages)).annotate(
+            last_message=Subquery(last),
+            unread=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0)),
         )
-        return qs.filter(last_message__isnull=False).order_by('-last_message')
+        return qs.order_by('-last_message')
 
     def last_message_at(self, obj):
         return obj.last_message
@@ -120,43 +338,55 @@ class ChatOrderAdmin(admin.ModelAdmin):
         return False
 
     def get_urls(self):
-        from django.urls import path
         urls = super().get_urls()
         custom = [
             path('<path:object_id>/reply/', self.admin_site.admin_view(self.reply_view), name='store_orderchat_reply'),
-            path('<path:object_id>/messages/', self.admin_site.admin_view(self.messages_view), name='store_orderchat_messages'),
+            # cacheable: the partial sets its own revalidation headers so polls can get 304s
+            path('<path:object_id>/messages/', self.admin_site.admin_view(self.messages_view, cacheable=True), name='store_orderchat_messages'),
             path('unread-count/', self.admin_site.admin_view(self.unread_count_view), name='store_orderchat_unread'),
             path('badge/', self.admin_site.admin_view(self.badge_view), name='store_orderchat_badge'),
         ]
         return custom + urls
 
     def reply_view(self, request, object_id):
-        from django.shortcuts import redirect
+        # admin_view skips its own csrf_protect for csrf_exempt views; the check runs in _reply
+        uploads.install(request)
+        return self._reply(request, object_id)
+    reply_view.csrf_exempt = True
+
+    @method_decorator(csrf_protect)
+    def _reply(self, request, object_id):
         if request.method == 'POST' and request.user.has_perm('store.change_order'):
             text = (request.POST.get('message') or '').strip()
             image = request.FILES.get('image')
             # basic validation for image
             if image and not getattr(image, 'content_type', '').startswith('image/'):
                 image = None
-            if image and getattr(image, 'size', 0) > 5 * 1024 * 1024:
+            if image and getattr(image, 'size', 0) > uploads.max_bytes():
                 image = None
             if text or image:
-                ChatMessage.objects.create(order_id=object_id, sender='admin', message=text, image=image, is_read=True)
-        from django.urls import reverse
+                with transaction.atomic():
+                    msg = ChatMessage(order_id=object_id, sender='admin', message=text, is_read=True)
+                    if image:
+                        uploads.attach_image(msg, image, request)
+                    msg.save()
+                    events.record('chat.message', msg.order_id, message=msg.id, sender=msg.sender)
+                    # the customer's other threads may still be waiting
+                    customers.refresh_open_chat(Customer.objects.filter(orders__pk=object_id))
         return redirect(reverse('admin:store_orderchat_change', args=[object_id]))
 
     def messages_view(self, request, object_id):
-        from django.shortcuts import render
-        msgs = ChatMessage.objects.filter(order_id=object_id)
-        return render(request, 'store/partials/chat_messages.html', {'messages': msgs, 'viewer': 'admin'})
+        metrics.CHAT_POLLS.inc(endpoint='admin_messages')
+        return chat_partial(request, object_id, 'admin')
 
     def unread_count_view(self, request):
-        from django.http import JsonResponse
-        count = ChatMessage.objects.filter(sender='customer', is_read=False).count()
-        return JsonResponse({'unread': count})
+        metrics.CHAT_POLLS.inc(endpoint='unread_count')
+        unread = ChatMessage.objects.filter(sender='customer', is_read=False).aggregate(n=Count('id'), last=Max('created_at'))
+        response = JsonResponse({'unread': unread['n']})
+        # an idle inbox still polls about every 15s so new chats show up promptly
+        return polling.advise(request, response, unread['last'], ceiling=15)
 
     def badge_view(self, request):
-        from django.shortcuts import render
         count = ChatMessage.objects.filter(sender='customer', is_read=False).count()
         return render(request, 'admin/partials/chat_badge.html', {'unread': count})
 
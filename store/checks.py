@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.staticfiles)
+def static_manifest_check(app_configs, **kwargs):
+    """Hashed static storage 500s every {% static %} lookup until collectstatic wrote its manifest."""
+    if not isinstance(staticfiles_storage, ManifestFilesMixin):
+        return []
+    if (Path(settings.STATIC_ROOT) / staticfiles_storage.manifest_name).exists():
+        return []
+    affected = 'the admin and every store page (USE_BUILT_ASSETS is on)' if settings.USE_BUILT_ASSETS else 'the admin'
+    return [Warning(
+        f'No static files manifest in {settings.STATIC_ROOT}; {affected} will fail with a 500.',
+        hint='Run `python manage.py build_assets --collect` before serving with DEBUG off.',
+        id='store.W001',
+    )]
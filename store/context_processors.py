@@ -0,0 +1,12 @@
+from django.conf import settings
+
+
+def fragments(request):
+    return {'fragment_ttl': getattr(settings, 'TEMPLATE_FRAGMENT_TTL', 600)}
+
+
+def assets(request):
+    return {
+        'use_built_assets': getattr(settings, 'USE_BUILT_ASSETS', False),
+        'htmx_version': getattr(settings, 'HTMX_VERSION', '1.9.12'),
+    }
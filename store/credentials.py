@@ -0,0 +1,89 @@
+import hashlib
+import json
+import time
+
+from django.db import connections
+
+from .models import CredentialSnapshot, OfflineCredentialAssignment
+
+
+def digest(username, password, notes):
+    # JSON keeps field boundaries unambiguous; 0024_credential_snapshots hashes the same way
+    raw = json.dumps([username, password, notes], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def snapshot_ids(contents):
+    """Map each (username, password, notes) to its snapshot id, creating the missing ones."""
+    by_digest = {digest(*content): content for content in set(contents)}
+    if not by_digest:
+        return {}
+    CredentialSnapshot.objects.bulk_create([
+        CredentialSnapshot(digest=key, username=username, password=password, notes=notes)
+        for key, (username, password, notes) in by_digest.items()
+    ], ignore_conflicts=True)
+    ids = dict(CredentialSnapshot.objects.filter(digest__in=by_digest).values_list('digest', 'pk'))
+    return {content: ids[key] for key, content in by_digest.items()}
+
+
+def prune():
+    """Delete snapshots no assignment points at any more. Returns rows removed."""
+    deleted, _ = CredentialSnapshot.objects.filter(assignments__isnull=True).delete()
+    return deleted
+
+
+def table_bytes(model, using='default'):
+    """On-disk size of a table plus its indexes, or None when the backend can't say cheaply."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_total_relation_size(%s::regclass)', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT data_length + index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        else:
+            try:
+                # needs SQLite built with the dbstat virtual table
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s "
+                    "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+            except Exception:
+                return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def storage_stats():
+    assignments = OfflineCredentialAssignment.objects.count()
+    snapshots = CredentialSnapshot.objects.count()
+    return {
+        'assignments': assignments,
+        'snapshots': snapshots,
+        'assignments_per_snapshot': assignments / snapshots if snapshots else 0.0,
+        'assignment_bytes': table_bytes(OfflineCredentialAssignment),
+        'snapshot_bytes': table_bytes(CredentialSnapshot),
+    }
+
+
+def bench_reads(orders=500, repeat=3):
+    """Best-of-`repeat` seconds to load the credentials of the most recent `orders` orders."""
+    order_ids = list(
+        OfflineCredentialAssignment.objects.order_by('-order_id').values_list('order_id', flat=True).distinct()[:orders]
+    )
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = list(
+            OfflineCredentialAssignment.objects.filter(order_id__in=order_ids).select_related('game', 'snapshot')
+        )
+        for a in rows:
+            a.username, a.password, a.notes
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) if order_ids else 0, best or 0.0
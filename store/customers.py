@@ -0,0 +1,93 @@
+from django.db.models import Count, DecimalField, Exists, F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ChatMessage, Customer, Order, OrderItem
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def customer_for(email):
+    customer, _ = Customer.objects.get_or_create(email=normalize_email(email))
+    return customer
+
+
+def record_order(email, total, now=None):
+    """Count a new order against its customer, creating the customer on first purchase.
+
+    Call inside the transaction that creates the order so both commit or roll back together.
+    """
+    now = now or timezone.now()
+    customer = customer_for(email)
+    # F() increments so concurrent checkouts for one email never lose an update
+    Customer.objects.filter(pk=customer.pk).update(
+        order_count=F('order_count') + 1,
+        lifetime_spend=F('lifetime_spend') + total,
+        last_order_at=now,
+    )
+    return customer
+
+
+def open_chat(customer_id):
+    """A customer message arrived; flag the thread as waiting for staff."""
+    if customer_id:
+        Customer.objects.filter(pk=customer_id, has_open_chat=False).update(has_open_chat=True)
+
+
+def refresh_open_chat(customers):
+    """Open while any of the customer's orders has a customer message as its latest chat entry."""
+    last_sender = ChatMessage.objects.filter(order=OuterRef('pk')).order_by('-pk').values('sender')[:1]
+    waiting = (
+        Order.objects.filter(customer=OuterRef('pk'))
+        .annotate(last_sender=Subquery(last_sender)).filter(last_sender='customer')
+    )
+    return customers.update(has_open_chat=Exists(waiting))
+
+
+def recount(customers=None):
+    """Recompute every aggregate from the order tables; used after backfills and to repair drift."""
+    customers = Customer.objects.all() if customers is None else customers
+    orders = Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+    spend = (
+        OrderItem.objects.filter(order__customer=OuterRef('pk')).order_by().values('order__customer')
+        .annotate(total=Sum(F('unit_price') * F('quantity'))).values('total')
+    )
+    money = DecimalField(max_digits=12, decimal_places=2)
+    updated = customers.update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n'), output_field=IntegerField()),
+                             Value(0, output_field=IntegerField())),
+        lifetime_spend=Coalesce(Subquery(spend, output_field=money), Value(0, output_field=money)),
+        last_order_at=Subquery(orders.annotate(last=Max('created_at')).values('last')),
+    )
+    refresh_open_chat(customers)
+    return updated
+
+
+def backfill(batch_size=1000, progress=None):
+    """Attach every order without a customer, oldest first, creating customers as needed.
+
+    Each batch is linked and its customers recounted before the next, so the command can be
+    stopped and rerun at any point. Returns (orders linked, customers touched).
+    """
+    linked = 0
+    touched = set()
+    while True:
+        batch = list(
+            Order.objects.filter(customer__isnull=True).order_by('pk').values_list('pk', 'email')[:batch_size]
+        )
+        if not batch:
+            return linked, len(touched)
+        by_email = {}
+        for pk, email in batch:
+            by_email.setdefault(normalize_email(email), []).append(pk)
+        Customer.objects.bulk_create([Customer(email=email) for email in by_email], ignore_conflicts=True)
+        ids = dict(Customer.objects.filter(email__in=by_email).values_list('email', 'pk'))
+        for email, order_ids in by_email.items():
+            Order.objects.filter(pk__in=order_ids).update(customer_id=ids[email])
+        recount(Customer.objects.filter(pk__in=ids.values()))
+        linked += len(batch)
+        touched.update(ids.values())
+        if progress:
+            progress(linked, len(touched))
@@ -0,0 +1,101 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from . import routers
+from .models import CredentialSnapshot, Order
+
+
+# 2: credentials are stored as CredentialSnapshot ids, not copied into the order row
+SNAPSHOT_VERSION = 2
+
+
+def build_payload(order):
+    """Group an order's items and delivered credentials into a JSON-safe snapshot.
+
+    Credentials are kept as snapshot ids; `resolve` reads them back for display.
+    """
+    items = list(order.items.select_related('game'))
+    assignments = order.offline_assignments.select_related('game').order_by('game__title', 'created_at', 'id')
+    games = []
+    by_game = {}
+    for a in assignments:
+        group = by_game.get(a.game_id)
+        if group is None:
+            group = by_game[a.game_id] = {
+                'title': a.game.title,
+                'category': a.game.get_category_display(),
+                'instructions': a.game.instructions,
+                'snapshots': [],
+            }
+            games.append(group)
+        group['snapshots'].append(a.snapshot_id)
+    return {
+        'v': SNAPSHOT_VERSION,
+        'items': [
+            {'title': it.game.title, 'quantity': it.quantity, 'subtotal': str(it.subtotal)}
+            for it in items
+        ],
+        'total': str(sum((it.subtotal for it in items), 0)),
+        'games': games,
+    }
+
+
+def resolve(payload):
+    """Copy of a stored snapshot with each game's credentials read back in one query."""
+    ids = {pk for game in payload['games'] for pk in game['snapshots']}
+    snapshots = CredentialSnapshot.objects.in_bulk(ids) if ids else {}
+    if len(snapshots) < len(ids):
+        # a replica that hasn't caught up with a fresh allocation yet
+        snapshots.update(CredentialSnapshot.objects.using(DEFAULT_DB_ALIAS).in_bulk(ids - snapshots.keys()))
+    games = [
+        {**game, 'credentials': [
+            {'username': s.username, 'password': s.password, 'notes': s.notes}
+            for s in (snapshots.get(pk) for pk in game['snapshots']) if s is not None
+        ]}
+        for game in payload['games']
+    ]
+    return {**payload, 'games': games}
+
+
+def get_payload(order):
+    """Return the resolved snapshot, rebuilding the stored one if it was invalidated or is older.
+
+    The rebuild is written back, so it reads the primary even when the page may use a replica.
+    """
+    payload = order.delivery_snapshot
+    if not payload or payload.get('v') != SNAPSHOT_VERSION:
+        token = routers.pin_primary()
+        try:
+            payload = build_payload(order)
+        finally:
+            routers.unpin(token)
+        order.delivery_snapshot = payload
+        Order.objects.filter(pk=order.pk).update(delivery_snapshot=payload)
+    return resolve(payload)
+
+
+def invalidate(order_id):
+    Order.objects.filter(pk=order_id, delivery_snapshot__isnull=False).update(delivery_snapshot=None)
+
+
+def email_body(order, payload, url):
+    body = (
+        f"Hello {order.name or 'there'}\n\n"
+        f"Thank you for your purchase.\n"
+        f"Order #: {order.id}\n"
+    )
+    # include account credentials inline (no numbering)
+    if payload['games']:
+        body += "\n\nAccount Credentials:\n"
+        for game in payload['games']:
+            body += f"\n{game['title']}:\n"
+            if game['instructions']:
+                body += f"Instructions: {game['instructions']}\n"
+            for c in game['credentials']:
+                body += f"Username: {c['username']}\nPassword: {c['password']}\n"
+                if c['notes']:
+                    body += f"Notes: {c['notes']}\n"
+                body += "\n"
+    # order page link
+    body += f"\nView your order page (valid 24 hours):\n{url}"
+    body += "\n\nIf some items are missing, we'll deliver them shortly."
+    return body
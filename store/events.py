@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobCursor, OrderEvent
+
+
+# JobCursor names of event consumers start with this; compaction never passes the slowest one
+CONSUMER_PREFIX = 'events:'
+# longest a writing transaction may stay open before a skipped event id is given up on
+GAP_TIMEOUT = timedelta(minutes=5)
+
+
+def record(kind, order_id, **data):
+    """Append one event; call inside the transaction that made the change."""
+    return OrderEvent.objects.create(kind=kind, order_id=order_id, data=data)
+
+
+def record_many(kind, rows):
+    """Append one event per (order_id, data) pair with a single INSERT."""
+    return OrderEvent.objects.bulk_create([OrderEvent(kind=kind, order_id=order_id, data=data) for order_id, data in rows])
+
+
+def read(after=0, limit=500, kinds=None):
+    """Events with id > after, oldest first. For a gap-safe incremental reader use consume()."""
+    qs = OrderEvent.objects.filter(pk__gt=after)
+    if kinds:
+        qs = qs.filter(kind__in=kinds)
+    return list(qs.order_by('pk')[:limit])
+
+
+def advance(position, gaps, limit=500, now=None, gap_timeout=GAP_TIMEOUT):
+    """Read the next batch past `position`, plus any late arrivals among `gaps`.
+
+    Ids are assigned at INSERT but transactions commit out of order, so a batch can skip an id
+    whose transaction is still open. Every skipped id is remembered in `gaps` and read again
+    next time until it shows up or is older than `gap_timeout` (it was rolled back).
+    Returns (events, new position, new gaps); gaps map str(id) to when it was first missed.
+    """
+    now = (now or timezone.now()).timestamp()
+    pending = {int(pk) for pk in gaps}
+    events = list(OrderEvent.objects.filter(Q(pk__gt=position) | Q(pk__in=pending)).order_by('pk')[:limit])
+    found = {e.pk for e in events}
+    top = max([position] + [e.pk for e in events if e.pk > position])
+    gaps = {pk: seen for pk, seen in gaps.items() if int(pk) not in found and now - seen < gap_timeout.total_seconds()}
+    for pk in range(position + 1, top):
+        if pk not in found:
+            gaps[str(pk)] = now
+    return events, top, gaps
+
+
+def consume(name, handler, batch_size=500, kinds=None, gap_timeout=GAP_TIMEOUT):
+    """Feed unseen events to handler(events) in batches under a named cursor. Returns events handled.
+
+    The cursor moves in the same transaction as the handler, so a failing batch is retried next run.
+    An event whose transaction commits after a later one was read arrives in a later batch.
+    """
+    handled = 0
+    while True:
+        with transaction.atomic():
+            cursor, _ = JobCursor.objects.select_for_update().get_or_create(name=CONSUMER_PREFIX + name)
+            events, position, gaps = advance(cursor.position, cursor.gaps, batch_size, gap_timeout=gap_timeout)
+            batch = [e for e in events if not kinds or e.kind in kinds]
+            if batch:
+                handler(batch)
+            if position != cursor.position or gaps != cursor.gaps:
+                cursor.position, cursor.gaps = position, gaps
+                cursor.save(update_fields=['position', 'gaps', 'updated_at'])
+        if not events:
+            return handled
+        handled += len(batch)
+
+
+def position(name):
+    return JobCursor.objects.filter(name=CONSUMER_PREFIX + name).values_list('position', flat=True).first() or 0
+
+
+def compact(retention, batch_size=5000, now=None):
+    """Delete events older than `retention` that every registered consumer has read. Returns rows deleted."""
+    now = now or timezone.now()
+    cutoff = now - retention
+    slowest = None
+    for position, gaps in JobCursor.objects.filter(name__startswith=CONSUMER_PREFIX).values_list('position', 'gaps'):
+        # an id still awaited by a consumer must survive until it arrives
+        bound = min([position] + [int(pk) - 1 for pk in gaps])
+        slowest = bound if slowest is None else min(slowest, bound)
+    qs = OrderEvent.objects.filter(created_at__lt=cutoff)
+    if slowest is not None:
+        qs = qs.filter(pk__lte=slowest)
+    deleted = 0
+    while True:
+        ids = list(qs.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += OrderEvent.objects.filter(pk__in=ids).delete()[0]
@@ -1,7 +1,50 @@
+import secrets
+
 from django import forms
 
+from .models import OfflineCredentialAssignment
+
+
+def new_idempotency_key():
+    return secrets.token_urlsafe(24)
+
 
 class CheckoutForm(forms.Form):
     email = forms.EmailField()
     name = forms.CharField(max_length=200, required=False)
+    # issued with each rendered form; a resubmit carrying the same key replays the first order
+    idempotency_key = forms.CharField(max_length=64, required=False, widget=forms.HiddenInput, initial=new_idempotency_key)
+
+    def clean_email(self):
+        return self.cleaned_data['email'].lower()
+
+
+class GameImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    file = forms.FileField(help_text='Columns: title, price, category, optional slug, original_price, image, description, instructions')
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+
+
+class OfflineCredentialAssignmentForm(forms.ModelForm):
+    # the content lives in a shared CredentialSnapshot; the admin resolves it on save
+    username = forms.CharField(max_length=255)
+    password = forms.CharField(max_length=255)
+    notes = forms.CharField(max_length=255, required=False)
+
+    class Meta:
+        model = OfflineCredentialAssignment
+        fields = ('order', 'game')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.snapshot_id:
+            for field in ('username', 'password', 'notes'):
+                self.fields[field].initial = getattr(self.instance, field)
 
+    def content(self):
+        return tuple(self.cleaned_data[field] for field in ('username', 'password', 'notes'))
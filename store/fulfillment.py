@@ -0,0 +1,272 @@
+import secrets
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+
+from . import credentials, delivery, events, mail, metrics, stock
+from .models import DeliveryLink, Game, GameCredential, OfflineCredentialAssignment, Order, OrderItem
+
+
+def allocate(game, demands):
+    """Assign rotating credentials from one game's pool to [(order_id, quantity), ...] in order.
+
+    Locks the game row so concurrent checkouts and backfills share one rotation pointer.
+    Returns the assignments created; empty when the pool is empty.
+    """
+    label = game.slug or str(game.pk)
+    with metrics.ALLOCATION_SECONDS.time(game=label):
+        assignments = _allocate(game, demands)
+    if assignments:
+        metrics.ALLOCATED_CREDENTIALS.inc(len(assignments), game=label)
+    return assignments
+
+
+def _allocate(game, demands):
+    rotation = Game.objects.select_for_update().filter(pk=game.pk).values_list('rotation_index', flat=True).first()
+    creds = list(GameCredential.objects.filter(game=game).order_by('id').values_list('username', 'password', 'notes'))
+    if not creds or rotation is None:
+        return []
+    pos = rotation % len(creds)
+    picks = []
+    for order_id, quantity in demands:
+        for _ in range(quantity):
+            picks.append((order_id, creds[pos]))
+            pos = (pos + 1) % len(creds)
+    # rotation repeats the pool, so a batch references at most len(creds) snapshots
+    snapshots = credentials.snapshot_ids(content for _, content in picks)
+    assignments = [
+        OfflineCredentialAssignment(order_id=order_id, game=game, snapshot_id=snapshots[content])
+        for order_id, content in picks
+    ]
+    OfflineCredentialAssignment.objects.bulk_create(assignments)
+    events.record_many('order.allocated', [
+        (order_id, {'game': game.pk, 'quantity': quantity}) for order_id, quantity in demands if quantity
+    ])
+    stock.adjust(game.pk, assigned=len(assignments))
+    # advance rotation pointer
+    game.rotation_index = pos
+    Game.objects.filter(pk=game.pk).update(rotation_index=pos)
+    return assignments
+
+
+@dataclass
+class BackfillStats:
+    scanned: int = 0
+    fulfilled: int = 0
+    assignments: int = 0
+    seconds: float = 0.0
+
+    @property
+    def orders_per_second(self):
+        return self.fulfilled / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (f"{self.fulfilled} of {self.scanned} partial order(s) fulfilled with {self.assignments} credential(s) "
+                f"in {self.seconds:.2f}s ({self.orders_per_second:.0f} orders/s)")
+
+
+def partial_orders(game_ids=None):
+    """Partial orders oldest first, narrowed to those containing the given games."""
+    qs = Order.objects.filter(status='partial')
+    if game_ids:
+        qs = qs.filter(pk__in=OrderItem.objects.filter(game_id__in=game_ids).values('order_id'))
+    return qs.order_by('created_at', 'id')
+
+
+def site_url(path):
+    return getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000').rstrip('/') + path
+
+
+def _delivery_tokens(order_ids, now):
+    """Delivery link token per order; stale links are extended, missing ones created."""
+    expires_at = now + timedelta(hours=24)
+    DeliveryLink.objects.filter(order_id__in=order_ids).update(expires_at=expires_at)
+    tokens = dict(DeliveryLink.objects.filter(order_id__in=order_ids).values_list('order_id', 'token'))
+    missing = [
+        DeliveryLink(order_id=order_id, token=secrets.token_urlsafe(32), expires_at=expires_at)
+        for order_id in order_ids if order_id not in tokens
+    ]
+    DeliveryLink.objects.bulk_create(missing)
+    tokens.update((link.order_id, link.token) for link in missing)
+    return tokens
+
+
+def _queue_emails(order_ids, now, kind='backfill'):
+    tokens = _delivery_tokens(order_ids, now)
+    messages = []
+    for order in Order.objects.filter(pk__in=order_ids):
+        payload = delivery.get_payload(order)
+        url = site_url(reverse('delivery_page', args=[tokens[order.pk]]))
+        messages.append(EmailMessage(
+            f"Your Cheappcgames Order #{order.id} is ready",
+            delivery.email_body(order, payload, url),
+            None,
+            [order.email],
+        ))
+    # only mail once the assignments are committed
+    transaction.on_commit(lambda: mail.send_messages(messages, kind=kind))
+
+
+def _allocate_missing(order_ids, stats):
+    """Allocate whatever the given orders still lack, one rotation lock per game, oldest order first.
+
+    Returns (orders left short by an empty pool, orders that received credentials).
+    """
+    items = list(
+        OrderItem.objects.filter(order_id__in=order_ids, game__category__in=Game.ACCOUNT_CATEGORIES)
+        .select_related('game')
+    )
+    delivered = {
+        (row['order_id'], row['game_id']): row['n']
+        for row in OfflineCredentialAssignment.objects.filter(order_id__in=order_ids)
+        .values('order_id', 'game_id').annotate(n=Count('id'))
+    }
+    rank = {order_id: i for i, order_id in enumerate(order_ids)}
+    demands = defaultdict(list)
+    games = {}
+    for it in items:
+        missing = it.quantity - delivered.get((it.order_id, it.game_id), 0)
+        if missing > 0:
+            games[it.game_id] = it.game
+            demands[it.game_id].append((it.order_id, missing))
+
+    short, touched = set(), set()
+    for game_id, wanted in demands.items():
+        wanted.sort(key=lambda d: rank[d[0]])
+        # the pool itself decides: the stock counter is a display value and may lag behind it
+        assigned = allocate(games[game_id], wanted)
+        if not assigned:
+            short.update(order_id for order_id, _ in wanted)
+        touched.update(a.order_id for a in assigned)
+        stats.assignments += len(assigned)
+    return short, touched
+
+
+def _fulfil_batch(order_ids, stats, now, notify):
+    short, touched = _allocate_missing(order_ids, stats)
+    fulfilled = [order_id for order_id in order_ids if order_id not in short]
+    # bulk_create skips the assignment signals, so drop stale snapshots here
+    Order.objects.filter(pk__in=touched - set(fulfilled)).update(delivery_snapshot=None)
+    if fulfilled:
+        Order.objects.filter(pk__in=fulfilled).update(status='completed', delivery_snapshot=None)
+        events.record_many('order.status', [(order_id, {'old': 'partial', 'new': 'completed'}) for order_id in fulfilled])
+        if notify:
+            _queue_emails(fulfilled, now)
+    stats.fulfilled += len(fulfilled)
+
+
+def backfill(game_ids=None, batch_size=200, notify=True, progress=None):
+    """Complete partial orders from restocked credential pools, oldest first. Returns BackfillStats.
+
+    Each batch claims its orders with SKIP LOCKED, so overlapping runs never allocate to the
+    same order twice; what an order still lacks is counted only after its row is locked.
+    """
+    stats = BackfillStats()
+    started = time.perf_counter()
+    now = timezone.now()
+    last = None
+    while True:
+        qs = partial_orders(game_ids)
+        if last is not None:
+            # orders still short stay partial; resume after the last one seen
+            qs = qs.filter(created_at__gte=last[0]).exclude(created_at=last[0], pk__lte=last[1])
+        with transaction.atomic():
+            batch = list(qs.select_for_update(skip_locked=True).values_list('pk', 'created_at')[:batch_size])
+            if not batch:
+                break
+            _fulfil_batch([pk for pk, _ in batch], stats, now, notify)
+        stats.scanned += len(batch)
+        last = (batch[-1][1], batch[-1][0])
+        if progress:
+            progress(stats)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def flag_restock(game_id):
+    """Mark a game's pool as grown; backfill_restocked() picks it up outside the request."""
+    Game.objects.filter(pk=game_id, backfill_pending=False).update(backfill_pending=True)
+
+
+def backfill_restocked(batch_size=200, notify=True, progress=None):
+    """Backfill the games flagged by flag_restock(). Returns BackfillStats, or None when none were flagged."""
+    game_ids = list(Game.objects.filter(backfill_pending=True).values_list('pk', flat=True))
+    if not game_ids:
+        return None
+    # clear first: a credential added while this runs flags the game again for the next pass
+    Game.objects.filter(pk__in=game_ids).update(backfill_pending=False)
+    return backfill(game_ids, batch_size=batch_size, notify=notify, progress=progress)
+
+
+@dataclass
+class QueueStats:
+    processed: int = 0
+    completed: int = 0
+    partial: int = 0
+    assignments: int = 0
+    seconds: float = 0.0
+
+    @property
+    def orders_per_second(self):
+        return self.processed / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (f"{self.processed} queued order(s) processed ({self.completed} completed, {self.partial} partial) "
+                f"with {self.assignments} credential(s) in {self.seconds:.2f}s ({self.orders_per_second:.0f} orders/s)")
+
+
+def queued_orders():
+    """Orders accepted by a queued checkout (CHECKOUT_MODE = 'queued') and not yet allocated."""
+    return Order.objects.filter(status='queued').order_by('created_at', 'id')
+
+
+def queue_position(order):
+    """Queued orders ahead of this one."""
+    return queued_orders().filter(created_at__lt=order.created_at).count()
+
+
+def _process_batch(order_ids, stats, now):
+    short, _ = _allocate_missing(order_ids, stats)
+    completed = [order_id for order_id in order_ids if order_id not in short]
+    partial = [order_id for order_id in order_ids if order_id in short]
+    for status, ids in (('completed', completed), ('partial', partial)):
+        if ids:
+            Order.objects.filter(pk__in=ids).update(status=status, delivery_snapshot=None)
+            events.record_many('order.status', [(order_id, {'old': 'queued', 'new': status}) for order_id in ids])
+    # like a synchronous checkout, partial orders get their link now and a second email on backfill
+    _queue_emails(order_ids, now, kind='order')
+    stats.completed += len(completed)
+    stats.partial += len(partial)
+
+
+def process_queue(batch_size=50, limit=None, progress=None):
+    """Allocate and email queued orders, oldest first, until the queue is empty. Returns QueueStats.
+
+    Several workers can run at once: each batch claims its orders with SKIP LOCKED, and
+    allocate() serializes them per game on the rotation pointer. SQLite has no SKIP LOCKED and
+    serializes writers anyway, so run a single worker there.
+    """
+    stats = QueueStats()
+    started = time.perf_counter()
+    while limit is None or stats.processed < limit:
+        with transaction.atomic():
+            size = batch_size if limit is None else min(batch_size, limit - stats.processed)
+            order_ids = list(
+                queued_orders().select_for_update(skip_locked=True).values_list('pk', flat=True)[:size]
+            )
+            if not order_ids:
+                break
+            _process_batch(order_ids, stats, timezone.now())
+        stats.processed += len(order_ids)
+        if progress:
+            progress(stats)
+    stats.seconds = time.perf_counter() - started
+    return stats
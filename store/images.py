@@ -0,0 +1,176 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow templates fall back to the original URLs
+    Image = None
+
+
+SIGNING_SALT = 'store.images'
+USER_AGENT = 'Cheappcgames image proxy'
+
+
+def widths():
+    return tuple(getattr(settings, 'IMAGE_PROXY_WIDTHS', (320, 640, 1280)))
+
+
+def enabled():
+    return Image is not None and getattr(settings, 'IMAGE_PROXY_ENABLED', True)
+
+
+def cache_root():
+    return Path(getattr(settings, 'IMAGE_CACHE_ROOT', Path(settings.MEDIA_ROOT) / 'img-cache'))
+
+
+def url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def variant_path(digest, width):
+    return cache_root() / digest[:2] / f'{digest}-{width}.webp'
+
+
+def meta_path(digest):
+    return cache_root() / digest[:2] / f'{digest}.json'
+
+
+def proxy_url(source, width):
+    """Signed proxy URL for one width; only URLs we rendered can ever be fetched."""
+    # plain Signer (no timestamp) so the same source always maps to the same cacheable URL
+    token = signing.Signer(salt=SIGNING_SALT).sign_object(source, compress=True)
+    return reverse('image_proxy', args=[width, token])
+
+
+def srcset(source):
+    return ', '.join(f'{proxy_url(source, w)} {w}w' for w in widths())
+
+
+def unsign(token):
+    try:
+        return signing.Signer(salt=SIGNING_SALT).unsign_object(token)
+    except signing.BadSignature:
+        return None
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _read_meta(digest):
+    try:
+        return json.loads(meta_path(digest).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def fetch(source, meta=None, timeout=10):
+    """GET the source, conditionally when meta carries validators. Returns (bytes or None, headers)."""
+    if not source.startswith(('http://', 'https://')):
+        raise ValueError('unsupported image URL')
+    headers = {'User-Agent': USER_AGENT}
+    meta = meta or {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    max_bytes = getattr(settings, 'IMAGE_PROXY_MAX_BYTES', 10 * 1024 * 1024)
+    request = urllib.request.Request(source, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            data = resp.read(max_bytes + 1)
+            if len(data) > max_bytes:
+                raise ValueError('image too large')
+            return data, resp.headers
+    except urllib.error.HTTPError as exc:
+        if exc.code == 304:
+            return None, exc.headers
+        raise
+
+
+def render_variants(data, digest):
+    """Write one WebP per configured width; never upscales past the source width."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        for width in widths():
+            variant = img.copy()
+            if variant.width > width:
+                height = max(1, round(variant.height * width / variant.width))
+                variant = variant.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            variant.save(out, 'WEBP', quality=getattr(settings, 'IMAGE_PROXY_QUALITY', 80), method=4)
+            _atomic_write(variant_path(digest, width), out.getvalue())
+
+
+def retry_pending(source, now=None):
+    """True while a recent failed fetch of source is backing off (see IMAGE_PROXY_RETRY_SECONDS)."""
+    now = time.time() if now is None else now
+    return _read_meta(url_hash(source)).get('retry_at', 0) > now
+
+
+def ensure_variants(source, refresh=False):
+    """Fetch the source once and cache its variants. Returns the digest.
+
+    A failed fetch is recorded in the meta file with a retry time and re-raised.
+    """
+    digest = url_hash(source)
+    cached = all(variant_path(digest, w).exists() for w in widths())
+    if cached and not refresh:
+        return digest
+    # validators are only useful while we still hold the variants they describe
+    meta = _read_meta(digest) if cached else {}
+    meta['url'] = source
+    try:
+        data, headers = fetch(source, meta)
+        if data is not None:
+            render_variants(data, digest)
+    except Exception as exc:
+        now = time.time()
+        meta.update({
+            'error': str(exc) or exc.__class__.__name__,
+            'failed_at': now,
+            'retry_at': now + getattr(settings, 'IMAGE_PROXY_RETRY_SECONDS', 300),
+        })
+        _atomic_write(meta_path(digest), json.dumps(meta).encode('utf-8'))
+        raise
+    for key in ('error', 'failed_at', 'retry_at'):
+        meta.pop(key, None)
+    meta.update({
+        'etag': headers.get('ETag') or meta.get('etag'),
+        'last_modified': headers.get('Last-Modified') or meta.get('last_modified'),
+        'fetched_at': time.time(),
+    })
+    _atomic_write(meta_path(digest), json.dumps(meta).encode('utf-8'))
+    return digest
+
+
+def stale_sources(max_age):
+    """Yield source URLs whose cached variants were fetched more than max_age seconds ago."""
+    root = cache_root()
+    if not root.exists():
+        return
+    cutoff = time.time() - max_age
+    for path in root.glob('*/*.json'):
+        try:
+            meta = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if meta.get('url') and meta.get('fetched_at', 0) < cutoff:
+            yield meta['url']
@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator, validate_slug
+from django.db import transaction
+
+from .models import Game
+from .slugs import SlugAllocator
+
+
+IMPORT_FIELDS = ('title', 'price', 'original_price', 'category', 'image', 'description', 'instructions')
+CATEGORIES = {key for key, _ in Game.CATEGORY_CHOICES}
+
+
+@dataclass
+class ImportStats:
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows(self):
+        return self.created + self.updated
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (f"{self.created} created, {self.updated} updated, {self.skipped} skipped "
+                f"in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)")
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'json'
+
+
+def read_rows(fileobj, fmt):
+    """Yield dict rows from a binary or text file object without loading CSV/JSONL fully."""
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig')
+    if fmt == 'csv':
+        yield from csv.DictReader(fileobj)
+    elif fmt == 'jsonl':
+        for line in fileobj:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        data = json.load(fileobj)
+        # accept a plain list or Django fixture-style {"fields": {...}} entries
+        for row in data:
+            yield row.get('fields', row) if isinstance(row, dict) else row
+
+
+def _first_error(exc):
+    return exc.messages[0] if exc.messages else str(exc)
+
+
+def _decimal(name, value, required=False):
+    # bulk_create skips field validation, and one out-of-range value would abort the whole batch
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'missing {name}')
+        return None
+    try:
+        amount = Decimal(str(value).strip().lstrip('$'))
+    except InvalidOperation:
+        raise ValueError(f'invalid amount {value!r}')
+    model_field = Game._meta.get_field(name)
+    try:
+        DecimalValidator(model_field.max_digits, model_field.decimal_places)(amount)
+    except ValidationError as exc:
+        raise ValueError(f'invalid {name} {value!r}: {_first_error(exc)}')
+    return amount
+
+
+def _text(name, value):
+    max_length = Game._meta.get_field(name).max_length
+    if len(value) > max_length:
+        raise ValueError(f'{name} longer than {max_length} characters')
+    return value
+
+
+def _build_game(row, allocator):
+    title = _text('title', (row.get('title') or '').strip())
+    if not title:
+        raise ValueError('missing title')
+    category = (row.get('category') or '').strip()
+    if category not in CATEGORIES:
+        raise ValueError(f'unknown category {category!r}')
+    price = _decimal('price', row.get('price'), required=True)
+    original_price = _decimal('original_price', row.get('original_price'))
+    image = _text('image', (row.get('image') or '').strip())
+    slug = (row.get('slug') or '').strip()
+    if slug:
+        try:
+            validate_slug(_text('slug', slug))
+        except ValidationError as exc:
+            raise ValueError(f'invalid slug {slug!r}: {_first_error(exc)}')
+        allocator.claim(slug)
+    else:
+        slug = allocator.allocate(title)
+    game = Game(
+        title=title,
+        slug=slug,
+        price=price,
+        original_price=original_price,
+        category=category,
+        image=image,
+        description=row.get('description') or '',
+        instructions=row.get('instructions') or '',
+    )
+    # bulk_create skips save(), which normally keeps these in step
+    game.refresh_pricing()
+    return game
+
+
+def import_games(rows, batch_size=500, progress=None):
+    """Upsert games by slug in batches. Rows without a slug get a freshly allocated one."""
+    stats = ImportStats()
+    started = time.perf_counter()
+    existing = set(Game.objects.exclude(slug=None).values_list('slug', flat=True).iterator())
+    allocator = SlugAllocator(existing)
+    batch = {}
+
+    def flush():
+        if not batch:
+            return
+        with transaction.atomic():
+            Game.objects.bulk_create(
+                batch.values(),
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=list(IMPORT_FIELDS) + ['discount_percent', 'price_band', 'updated_at'],
+            )
+        for slug in batch:
+            if slug in existing:
+                stats.updated += 1
+            else:
+                stats.created += 1
+                existing.add(slug)
+        batch.clear()
+        if progress:
+            progress(stats)
+
+    for line_no, row in enumerate(rows, start=1):
+        try:
+            game = _build_game(row, allocator)
+        except (ValueError, AttributeError) as exc:
+            stats.skipped += 1
+            stats.errors.append((line_no, str(exc)))
+            continue
+        # a slug repeated inside one batch would hit the same row twice in one upsert
+        if game.slug in batch:
+            flush()
+        batch[game.slug] = game
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from store import customers
+
+
+class Command(BaseCommand):
+    help = 'Create Customer aggregates for orders placed before they existed, or recount them all.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders linked per pass')
+        parser.add_argument('--recount', action='store_true', help='Also recompute every customer from its orders')
+
+    def handle(self, *args, **options):
+        linked, touched = customers.backfill(
+            batch_size=options['batch_size'],
+            progress=lambda n, c: self.stdout.write(f'  {n} order(s) linked') if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f'Linked {linked} order(s) to {touched} customer(s).')
+        if options['recount']:
+            updated = customers.recount()
+            self.stdout.write(f'Recounted {updated} customer(s).')
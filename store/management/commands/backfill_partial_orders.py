@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import fulfillment
+
+
+class Command(BaseCommand):
+    help = 'Allocate credentials to partial orders whose games have been restocked and email the customers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', type=int, action='append', dest='games', help='Only orders containing this game id (repeatable)')
+        parser.add_argument('--restocked', action='store_true',
+                            help='Only games whose pool grew since the last pass (flagged when credentials are added)')
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Keep running, backfilling restocked games every SECONDS (worker mode; implies --restocked)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Orders per transaction')
+        parser.add_argument('--no-email', action='store_true', help='Update orders without emailing customers')
+
+    def handle(self, *args, **options):
+        kwargs = dict(
+            batch_size=options['batch_size'],
+            notify=not options['no_email'],
+            progress=lambda s: self.stdout.write(f'  {s.scanned} scanned, {s.fulfilled} fulfilled') if options['verbosity'] > 1 else None,
+        )
+        if not (options['restocked'] or options['loop']):
+            self.stdout.write(fulfillment.backfill(game_ids=options['games'], **kwargs).summary())
+            return
+        while True:
+            stats = fulfillment.backfill_restocked(**kwargs)
+            if stats is not None:
+                self.stdout.write(stats.summary())
+            elif options['verbosity'] > 1:
+                self.stdout.write('No restocked games.')
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
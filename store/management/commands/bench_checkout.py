@@ -0,0 +1,111 @@
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store import fulfillment
+from store.models import Game, GameCredential, Order
+
+
+class Command(BaseCommand):
+    help = ('Load-test checkout in sync and queued mode and compare orders per second. '
+            'Runs against a throwaway test database; the real one is never touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200, help='Checkouts per mode')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Parallel buyers (keep 1 on SQLite, which serializes writers)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Queue workers in queued mode (1 on SQLite, which has no SKIP LOCKED)')
+        parser.add_argument('--games', type=int, default=1, help='Hot games the buyers spread over')
+        parser.add_argument('--credentials', type=int, default=20, help='Credential pool per game')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and options['workers'] > 1:
+            raise CommandError('SQLite has no SKIP LOCKED, so extra workers only queue on its write lock; use --workers 1.')
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            # a file, not the shared in-memory test DB, whose table locks fail concurrent threads outright;
+            # IMMEDIATE makes writers queue on the busy timeout instead of failing a read-to-write upgrade
+            connection.settings_dict['TEST']['NAME'] = str(Path(tempfile.gettempdir()) / 'bench_checkout.sqlite3')
+            connection.settings_dict['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            games = self._games(options['games'], options['credentials'])
+            # locmem mail, no rate limits: measure checkout, not SMTP or the throttle
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                                   THROTTLE_ENABLED=False):
+                for mode in ('sync', 'queued'):
+                    with override_settings(CHECKOUT_MODE=mode):
+                        self._run(mode, games, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _games(self, count, pool):
+        games = []
+        for i in range(count):
+            game = Game.objects.create(title=f'Bench Game {i}', category='offline-account', price=Decimal('9.99'))
+            GameCredential.objects.bulk_create([
+                GameCredential(game=game, username=f'bench-{i}-{n}', password='secret') for n in range(pool)
+            ])
+            games.append(game.pk)
+        return games
+
+    def _buy(self, n, games):
+        client = Client()
+        game_id = games[n % len(games)]
+        client.post(reverse('cart_add', args=[game_id]))
+        started = time.perf_counter()
+        response = client.post(reverse('checkout'), {'email': f'buyer{n}@example.com', 'idempotency_key': f'bench-{n}'})
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        if response.status_code != 302:
+            raise RuntimeError(f'checkout returned {response.status_code}')
+        return elapsed
+
+    def _drain(self, stop):
+        processed = 0
+        while True:
+            done = stop.is_set()
+            stats = fulfillment.process_queue()
+            processed += stats.processed
+            if done and not stats.processed:
+                connections.close_all()
+                return processed
+            if not stats.processed:
+                time.sleep(0.01)
+
+    def _run(self, mode, games, options):
+        n = options['orders']
+        first = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        stop = threading.Event()
+        workers = options['workers'] if mode == 'queued' else 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers or 1) as pool:
+            drains = [pool.submit(self._drain, stop) for _ in range(workers)]
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as buyers:
+                latencies = list(buyers.map(lambda i: self._buy(first + i, games), range(n)))
+            accepted = time.perf_counter() - started
+            stop.set()
+            for drain in drains:
+                drain.result()
+        delivered = time.perf_counter() - started
+
+        pending = Order.objects.filter(pk__gt=first, status='queued').count()
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f'{mode:>6}: accepted {n / accepted:7.1f} orders/s, delivered {n / delivered:7.1f} orders/s; '
+            f'checkout p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms'
+            + (f'; {pending} left queued' if pending else '')
+        )
@@ -0,0 +1,89 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.engine import Engine
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from store.models import ChatMessage, Game
+
+
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-templates',
+    }
+}
+NO_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark template parsing and rendering of a large game grid and chat thread (no DB writes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        games = [
+            Game(
+                pk=i, slug=f'game-{i}', title=f'Benchmark Game {i}', category=Game.CATEGORY_CHOICES[i % 3][0],
+                price=Decimal('9.99'), original_price=Decimal('19.99') if i % 2 else None,
+                image=f'https://example.com/{i}.jpg', stock_available=i % 5, updated_at=now,
+            )
+            for i in range(1, options['games'] + 1)
+        ]
+        messages = [
+            ChatMessage(pk=i, order_id=1, sender='customer' if i % 2 else 'admin', message=f'Message {i}', created_at=now)
+            for i in range(1, options['messages'] + 1)
+        ]
+        request = RequestFactory().get('/')
+        request.session = {}
+
+        self.stdout.write(f"Parse (uncached loader): {self._parse_ms():.2f} ms for grid + chat partials")
+        cases = [
+            ('game_grid', 'store/partials/game_grid.html',
+             {'games': games, 'is_fullpage': True, 'catalog_version': f'bench-{now.timestamp()}'}),
+            ('chat_messages', 'store/partials/chat_messages.html',
+             {'messages': messages, 'viewer': 'customer', 'chat_key': f'bench-{now.timestamp()}'}),
+        ]
+        for caches, mode in ((NO_CACHES, 'no fragment cache'), (BENCH_CACHES, 'fragment cache')):
+            # isolated cache so fragment keys start cold and nothing leaks into the real cache
+            with override_settings(CACHES=caches):
+                for label, template_name, context in cases:
+                    self._report(f'{label} [{mode}]', template_name, context, request, options['repeat'])
+
+    def _parse_ms(self):
+        django_engine = engines['django'].engine
+        plain = Engine(
+            dirs=django_engine.dirs,
+            loaders=['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+            libraries=django_engine.libraries,
+        )
+        start = time.perf_counter()
+        for name in ('store/partials/game_grid.html', 'store/components/game_card.html',
+                     'store/partials/chat_messages.html'):
+            plain.get_template(name)
+        return (time.perf_counter() - start) * 1000
+
+    def _report(self, label, template_name, context, request, repeat):
+        template = engines['django'].get_template(template_name)
+        start = time.perf_counter()
+        template.render(context, request)
+        cold = (time.perf_counter() - start) * 1000
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            template.render(context, request)
+            timings.append((time.perf_counter() - start) * 1000)
+        warm = sum(timings) / len(timings)
+        self.stdout.write(f"{label}: first {cold:.1f} ms, then {warm:.1f} ms avg over {repeat}")
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from store import throttling
+from store.throttling import throttle
+
+
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-throttle',
+    }
+}
+
+
+def plain_view(request):
+    return HttpResponse('ok')
+
+
+class Command(BaseCommand):
+    help = "Measure the throttle's own overhead per request for the memory and cache stores."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--clients', type=int, default=1000, help='Distinct client IPs to spread requests over')
+
+    def handle(self, *args, **options):
+        n, clients = options['requests'], options['clients']
+        factory = RequestFactory()
+        requests = [factory.post('/', REMOTE_ADDR=f'10.0.{i // 256 % 256}.{i % 256}') for i in range(clients)]
+        # generous rate so every request takes the allowed path and runs the view
+        throttled = throttle('bench', ('bench_ip', throttling.client_ip, '1000000/s'))(plain_view)
+
+        baseline = self._per_request(plain_view, requests, n)
+        self.stdout.write(f'view alone: {baseline:.2f} us/request')
+        for label, store in (('memory', 'memory'), ('cache (locmem)', 'cache')):
+            # isolated cache so the benchmark never touches real buckets
+            with override_settings(THROTTLE_STORE=store, CACHES=BENCH_CACHES):
+                cost = self._per_request(throttled, requests, n)
+            self.stdout.write(f'{label}: {cost:.2f} us/request ({cost - baseline:.2f} us throttle overhead)')
+
+    def _per_request(self, view, requests, n):
+        started = time.perf_counter()
+        for i in range(n):
+            view(requests[i % len(requests)])
+        return (time.perf_counter() - started) / n * 1e6
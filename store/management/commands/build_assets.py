@@ -0,0 +1,87 @@
+import gzip
+import shlex
+import subprocess
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+
+# (tailwind config, input, output relative to static/)
+STYLESHEETS = [
+    ('tailwind.config.js', 'assets/app.css', 'build/app.css'),
+    ('tailwind.admin.config.js', 'assets/admin.css', 'build/admin.css'),
+]
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml'}
+MIN_COMPRESS_SIZE = 256
+
+
+class Command(BaseCommand):
+    help = 'Compile purged Tailwind stylesheets, vendor HTMX, and optionally collect + precompress static files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collect', action='store_true',
+                            help='Run collectstatic afterwards and write .gz/.br variants into STATIC_ROOT')
+        parser.add_argument('--refresh-vendor', action='store_true', help='Re-download vendored scripts')
+        parser.add_argument('--skip-css', action='store_true', help='Skip the Tailwind compile step')
+
+    def handle(self, *args, **options):
+        static_dir = Path(settings.STATICFILES_DIRS[0])
+        if not options['skip_css']:
+            self.build_css(static_dir)
+        self.vendor_htmx(static_dir, refresh=options['refresh_vendor'])
+        if options['collect']:
+            call_command('collectstatic', interactive=False, verbosity=0)
+            written = self.precompress(Path(settings.STATIC_ROOT))
+            self.stdout.write(f'Collected static files and wrote {written} precompressed variant(s).')
+
+    def build_css(self, static_dir):
+        cli = shlex.split(settings.TAILWIND_CLI)
+        for config, source, target in STYLESHEETS:
+            output = static_dir / target
+            output.parent.mkdir(parents=True, exist_ok=True)
+            cmd = cli + ['-c', str(settings.BASE_DIR / config), '-i', str(settings.BASE_DIR / source),
+                         '-o', str(output), '--minify']
+            try:
+                subprocess.run(cmd, check=True, cwd=settings.BASE_DIR)
+            except FileNotFoundError:
+                raise CommandError(f'Tailwind CLI not found ({settings.TAILWIND_CLI}); set TAILWIND_CLI.')
+            except subprocess.CalledProcessError as exc:
+                raise CommandError(f'Tailwind build failed for {source}: exit {exc.returncode}')
+            self.stdout.write(f'Built {target} ({output.stat().st_size} bytes)')
+
+    def vendor_htmx(self, static_dir, refresh=False):
+        target = static_dir / 'vendor' / 'htmx.min.js'
+        if target.exists() and not refresh:
+            return
+        url = f'https://unpkg.com/htmx.org@{settings.HTMX_VERSION}/dist/htmx.min.js'
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with urllib.request.urlopen(url, timeout=30) as resp:
+                target.write_bytes(resp.read())
+        except OSError as exc:
+            raise CommandError(f'Could not download {url}: {exc}')
+        self.stdout.write(f'Vendored htmx {settings.HTMX_VERSION} -> {target.relative_to(settings.BASE_DIR)}')
+
+    def precompress(self, root):
+        written = 0
+        for path in root.rglob('*'):
+            if not path.is_file() or path.suffix not in COMPRESSIBLE:
+                continue
+            data = path.read_bytes()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            # mtime=0 keeps the .gz byte-identical across builds
+            path.with_name(path.name + '.gz').write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+            written += 1
+            if brotli is not None:
+                path.with_name(path.name + '.br').write_bytes(brotli.compress(data))
+                written += 1
+        return written
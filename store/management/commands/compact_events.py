@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import events
+from store.models import JobCursor
+
+
+class Command(BaseCommand):
+    help = 'Delete order events past the retention window that every consumer has already read.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_EVENT_RETENTION_DAYS', 90),
+                            help='Keep events newer than this many days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for cursor in JobCursor.objects.filter(name__startswith=events.CONSUMER_PREFIX).order_by('position'):
+            self.stdout.write(f'  consumer {cursor.name[len(events.CONSUMER_PREFIX):]} at event {cursor.position}')
+        deleted = events.compact(timedelta(days=options['days']), batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} event(s) older than {options["days"]} day(s).')
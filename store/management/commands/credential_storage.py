@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from store import credentials
+
+
+def _size(value):
+    return 'n/a' if value is None else f'{value / 1024:.0f} KiB'
+
+
+class Command(BaseCommand):
+    help = 'Report how much space delivered credentials take and how fast they read back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bench', type=int, default=0, metavar='ORDERS',
+                            help='Also time loading the credentials of this many recent orders')
+        parser.add_argument('--prune', action='store_true', help='Delete snapshots no assignment references')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            self.stdout.write(f'Pruned {credentials.prune()} unused snapshot(s).')
+        stats = credentials.storage_stats()
+        self.stdout.write(
+            f"{stats['assignments']} assignment(s) share {stats['snapshots']} snapshot(s) "
+            f"({stats['assignments_per_snapshot']:.1f} per snapshot)"
+        )
+        self.stdout.write(f"assignment table: {_size(stats['assignment_bytes'])}, "
+                          f"snapshot table: {_size(stats['snapshot_bytes'])}")
+        if options['bench']:
+            rows, seconds = credentials.bench_reads(options['bench'])
+            self.stdout.write(f'Loaded {rows} credential(s) for {options["bench"]} order(s) in {seconds * 1000:.1f} ms')
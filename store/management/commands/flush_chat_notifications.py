@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import notifications
+
+
+class Command(BaseCommand):
+    help = 'Email staff one digest per chat thread that has gone quiet or waited CHAT_NOTIFY_MAX_DELAY.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='Keep running and flush every SECONDS instead of once (worker mode)')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = notifications.flush()
+            if sent or options['verbosity'] > 1:
+                self.stdout.write(f'Sent {sent} chat digest(s).')
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
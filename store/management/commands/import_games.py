@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importer import detect_format, import_games, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV, JSON or JSON Lines catalog into Game, upserting by slug.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        try:
+            fileobj = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {stats.rows} rows written...')
+
+        with fileobj:
+            stats = import_games(read_rows(fileobj, fmt), batch_size=options['batch_size'], progress=progress)
+        for line_no, error in stats.errors[:20]:
+            self.stderr.write(f'row {line_no}: {error}')
+        if len(stats.errors) > 20:
+            self.stderr.write(f'... and {len(stats.errors) - 20} more')
+        self.stdout.write(self.style.SUCCESS(stats.summary()))
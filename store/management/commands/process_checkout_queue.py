@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from store import fulfillment
+
+
+class Command(BaseCommand):
+    help = 'Allocate credentials to orders queued by CHECKOUT_MODE = "queued" and email their delivery links.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Orders claimed per transaction')
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Keep running, polling an empty queue every SECONDS (worker mode; run several for a '
+                                 'pool on PostgreSQL/MySQL, only one on SQLite)')
+
+    def handle(self, *args, **options):
+        if options['loop'] and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                'SQLite has no SKIP LOCKED: run a single worker, extra ones only wait on the write lock.'
+            ))
+        while True:
+            stats = fulfillment.process_queue(
+                batch_size=options['batch_size'],
+                progress=lambda s: self.stdout.write(f'  {s.processed} processed') if options['verbosity'] > 1 else None,
+            )
+            if stats.processed or options['verbosity'] > 1:
+                self.stdout.write(stats.summary())
+            if not options['loop']:
+                return
+            if not stats.processed:
+                time.sleep(options['loop'])
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.models import Game
+
+
+FIELDS = ['discount_percent', 'price_band', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored discount_percent and price_band of every game (after bulk SQL price edits).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        scanned = updated = 0
+        changed = []
+        games = Game.objects.only('id', 'price', 'original_price', 'discount_percent', 'price_band', 'updated_at')
+        for game in games.iterator(chunk_size=batch_size):
+            scanned += 1
+            if game.refresh_pricing():
+                # move the catalog version so cached grids pick up the new badges
+                game.updated_at = timezone.now()
+                changed.append(game)
+            if len(changed) >= batch_size:
+                updated += Game.objects.bulk_update(changed, FIELDS)
+                changed = []
+        updated += Game.objects.bulk_update(changed, FIELDS)
+        self.stdout.write(f'Checked {scanned} game(s), updated {updated}.')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from store import images
+from store.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Revalidate cached image thumbnails in the background; --prime fetches catalog images not cached yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=24 * 3600, help='Revalidate entries older than this many seconds')
+        parser.add_argument('--prime', action='store_true', help='Also fetch every Game.image that has no variants yet')
+
+    def handle(self, *args, **options):
+        if not images.enabled():
+            self.stderr.write('Image proxy disabled or Pillow not installed; nothing to do.')
+            return
+        done = failed = 0
+        sources = list(images.stale_sources(options['max_age']))
+        refresh = set(sources)
+        if options['prime']:
+            sources += [u for u in Game.objects.exclude(image='').values_list('image', flat=True).distinct() if u not in refresh]
+        for source in sources:
+            try:
+                images.ensure_variants(source, refresh=source in refresh)
+                done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'{source}: {exc}')
+        self.stdout.write(f'Refreshed {done} image(s), {failed} failed.')
@@ -0,0 +1,27 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Fold new orders into the co-purchase matrix and refresh the top-K related games. Run on a schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders per transaction')
+        parser.add_argument('--settle', type=int, default=60,
+                            help='Skip orders younger than this many seconds (they may still be committing)')
+        parser.add_argument('--rebuild', action='store_true', help='Drop the matrix and recompute from every order')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            recommendations.reset()
+        started = time.perf_counter()
+        orders, games = recommendations.refresh(
+            batch_size=options['batch_size'],
+            settle=timedelta(seconds=options['settle']),
+            progress=lambda o, g: self.stdout.write(f'  {o} order(s) processed') if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f'Processed {orders} order(s), re-ranked {games} game(s) in {time.perf_counter() - started:.2f}s.')
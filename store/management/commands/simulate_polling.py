@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from store import polling
+
+
+class Command(BaseCommand):
+    help = ('Simulate chat polling for a mix of idle and active tabs and compare a fixed interval with '
+            'the server-paced delays from store/polling.py (no requests are made).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Open chat tabs')
+        parser.add_argument('--minutes', type=int, default=60, help='Simulated time')
+        parser.add_argument('--active', type=float, default=0.2, help='Share of tabs with a live conversation')
+        parser.add_argument('--hidden', type=float, default=0.4, help='Share of tabs left in the background')
+        parser.add_argument('--load', type=float, default=1.0, help='Load factor (load average per CPU) to assume')
+        parser.add_argument('--fixed', type=float, default=2.0, help='Interval of the fixed-rate baseline, seconds')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        results = polling.simulate(
+            clients=options['clients'], minutes=options['minutes'], active=options['active'],
+            hidden=options['hidden'], load=options['load'], fixed=options['fixed'], seed=options['seed'],
+        )
+        fixed_total = sum(r['requests'] for r in results['fixed'].values())
+        for name, groups in results.items():
+            total = sum(r['requests'] for r in groups.values())
+            lags = [lag for r in groups.values() for lag in r['lags']]
+            self.stdout.write(
+                f"{name:>8}: {total} requests ({total / options['clients'] / options['minutes']:.1f}/tab/min), "
+                f"message seen after {sum(lags) / len(lags) if lags else 0:.1f}s mean, "
+                f"{polling.percentile(lags, 0.95):.1f}s p95"
+                + (f", {100 * (1 - total / fixed_total):.0f}% fewer requests" if name != 'fixed' else '')
+            )
+            for group, r in sorted(groups.items()):
+                if r['clients']:
+                    self.stdout.write(
+                        f"          {group:<15} {r['clients']:>5} tabs, {r['requests'] / r['clients'] / options['minutes']:5.1f}/tab/min, "
+                        f"p95 seen after {polling.percentile(r['lags'], 0.95):.1f}s"
+                    )
+        self.stdout.write('Hidden-tab lag is time in the background; those tabs refresh the moment they are shown.')
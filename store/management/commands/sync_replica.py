@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import routers
+
+
+class Command(BaseCommand):
+    help = 'Copy the SQLite primary into each SQLite replica stand-in (local stand-in for replication).'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Only SQLite stand-ins can be synced; real replicas replicate on their own.')
+        aliases = routers.replicas()
+        if not aliases:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS.')
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in aliases:
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'Synced {alias} <- default')
+        finally:
+            source.close()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store import stock
+
+
+class Command(BaseCommand):
+    help = 'Expire stale cart reservations and optionally recount stock counters from the credential tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true', help='Rebuild every Game stock counter from scratch')
+
+    def handle(self, *args, **options):
+        expired = stock.expire_reservations()
+        self.stdout.write(f'Expired {expired} reservation(s).')
+        if options['recount']:
+            updated = stock.recount()
+            self.stdout.write(f'Recounted stock for {updated} game(s).')
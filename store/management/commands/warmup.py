@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import warmup
+
+
+class Command(BaseCommand):
+    help = ('Warm a deploy: compile every template, open DB connections and prime catalog/detail caches. '
+            'Reports cold import time and per-step timings, optionally failing above a budget.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=8, help='Detail pages to prime (best sellers first)')
+        parser.add_argument('--skip-imports', action='store_true', help='Skip the -X importtime subprocess')
+        parser.add_argument('--max-import-ms', type=float, help='Fail when the cold import takes longer')
+        parser.add_argument('--max-ms', type=float, help='Fail when the warmup steps take longer in total')
+
+    def handle(self, *args, **options):
+        if not options['skip_imports']:
+            total, slowest = warmup.import_profile()
+            self.stdout.write(f'{"imports":<10} {total:8.1f} ms')
+            for module, ms in slowest:
+                self.stdout.write(f'  {module:<40} {ms:8.1f} ms')
+            if options['max_import_ms'] is not None and total > options['max_import_ms']:
+                raise CommandError(f'Cold import took {total:.0f} ms (budget {options["max_import_ms"]:.0f} ms).')
+
+        if not warmup.shared_cache():
+            self.stdout.write(self.style.WARNING(
+                'The default cache is per-process; primed pages only warm this command, not the web workers. '
+                'Set REDIS_URL (or another shared backend) for the catalog step to help.'
+            ))
+        steps = warmup.warm(top=options['top'])
+        for name, ms, detail in steps:
+            self.stdout.write(f'{name:<10} {ms:8.1f} ms  {self._describe(name, detail)}')
+        total = sum(ms for _, ms, _ in steps)
+        self.stdout.write(f'{"total":<10} {total:8.1f} ms')
+
+        failed = dict((name, detail) for name, _, detail in steps).get('catalog', (0, []))[1]
+        if failed:
+            raise CommandError(f'Warmup requests failed: {", ".join(failed)}')
+        if options['max_ms'] is not None and total > options['max_ms']:
+            raise CommandError(f'Warmup took {total:.0f} ms (budget {options["max_ms"]:.0f} ms).')
+
+    def _describe(self, name, detail):
+        if name == 'database':
+            return ', '.join(detail)
+        if name == 'templates':
+            return f'{detail} template(s)'
+        return f'{detail[0]} page(s)'
@@ -0,0 +1,273 @@
+import abc
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import ChatMessage, Order, PendingNotification
+
+
+# joins label values into the string keys stored in the per-process files
+SEP = '\x1f'
+# label value that new label sets fold into once a metric holds METRICS_MAX_SERIES of them
+OVERFLOW = 'other'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        """Label key for an update; call under the registry lock.
+
+        Labels such as the game slug grow with the catalog, so past METRICS_MAX_SERIES label
+        sets per process new ones are counted under OVERFLOW instead of adding series.
+        """
+        key = _label_key(self.labelnames, labels)
+        if key not in self.values and len(self.values) >= getattr(settings, 'METRICS_MAX_SERIES', 50):
+            key = (OVERFLOW,) * len(self.labelnames)
+        return key
+
+    @abc.abstractmethod
+    def state(self):
+        """JSON-safe values for the per-process file."""
+
+    @abc.abstractmethod
+    def samples(self, merged):
+        """Yield (sample name, label pairs, value) from the merged states."""
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        with self.registry.lock:
+            key = self._key(labels)
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+    def state(self):
+        return {SEP.join(k): v for k, v in self.values.items()}
+
+    @staticmethod
+    def merge(total, state):
+        for key, value in state.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, merged):
+        for key, value in sorted(merged.items()):
+            yield f'{self.name}_total', zip(self.labelnames, key.split(SEP) if self.labelnames else ()), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # values: labels -> [per-bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        with self.registry.lock:
+            key = self._key(labels)
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+        self.registry.changed()
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def state(self):
+        return {SEP.join(k): list(v) for k, v in self.values.items()}
+
+    @staticmethod
+    def merge(total, state):
+        for key, row in state.items():
+            current = total.get(key)
+            total[key] = row if current is None else [a + b for a, b in zip(current, row)]
+
+    def samples(self, merged):
+        for key, row in sorted(merged.items()):
+            labels = list(zip(self.labelnames, key.split(SEP) if self.labelnames else ()))
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                yield f'{self.name}_bucket', labels + [('le', _format_value(bound))], cumulative
+            yield f'{self.name}_sum', labels, row[-2]
+            yield f'{self.name}_count', labels, row[-1]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    """Process-local metrics. With METRICS_DIR set, each process also dumps its values to
+    <dir>/<pid>.json (at most every METRICS_FLUSH_INTERVAL seconds and at exit) and
+    render() sums every file, so any worker can answer a scrape for all of them.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def directory(self):
+        path = getattr(settings, 'METRICS_DIR', None) or os.environ.get('METRICS_DIR')
+        return Path(path) if path else None
+
+    def snapshot(self):
+        with self.lock:
+            return {name: metric.state() for name, metric in self.metrics.items()}
+
+    def changed(self):
+        if self.directory() is None:
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            self._last_flush = now
+            self.flush()
+
+    def flush(self):
+        directory = self.directory()
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, directory / f'{os.getpid()}.json')
+
+    def _states(self):
+        directory = self.directory()
+        if directory is None:
+            return [self.snapshot()]
+        self.flush()
+        states = []
+        for path in directory.glob('*.json'):
+            try:
+                states.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return states
+
+    def render(self, extra=()):
+        """Prometheus text exposition of every metric plus `extra` gauge families."""
+        merged = {name: {} for name in self.metrics}
+        for state in self._states():
+            for name, values in state.items():
+                if name in self.metrics:
+                    self.metrics[name].merge(merged[name], values)
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample, labels, value in metric.samples(merged[name]):
+                lines.append(f'{sample}{_format_labels(list(labels))} {_format_value(value)}')
+        for name, documentation, samples in extra:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+CHECKOUT_SECONDS = Histogram(REGISTRY, 'store_checkout_seconds', 'Checkout POST latency.', ['outcome'])
+ALLOCATION_SECONDS = Histogram(REGISTRY, 'store_allocation_seconds', 'Credential allocation time per game.', ['game'])
+ALLOCATED_CREDENTIALS = Counter(REGISTRY, 'store_allocated_credentials', 'Credentials assigned to orders.', ['game'])
+CHAT_POLLS = Counter(REGISTRY, 'store_chat_polls', 'Chat poll requests.', ['endpoint'])
+MAIL_SECONDS = Histogram(REGISTRY, 'store_mail_seconds', 'Time spent sending email.', ['kind'])
+THROTTLED = Counter(REGISTRY, 'store_throttled_requests', 'Requests rejected by a rate limit.', ['view'])
+MAIL_FAILURES = Counter(REGISTRY, 'store_mail_failures', 'Emails that could not be sent.', ['kind'])
+
+
+def business_gauges():
+    """Gauge families read from the database at scrape time, so every worker reports the same."""
+    by_status = dict(Order.objects.order_by().values_list('status').annotate(n=Count('id')))
+    unread = ChatMessage.objects.filter(sender='customer', is_read=False)
+    return [
+        ('store_orders', 'Orders by status.',
+         [([('status', status)], by_status.get(status, 0)) for status, _ in Order.STATUS_CHOICES]),
+        ('store_partial_orders', 'Orders waiting for credentials.', [([], by_status.get('partial', 0))]),
+        ('store_open_chat_threads', 'Orders with unread customer messages.',
+         [([], unread.order_by().values('order_id').distinct().count())]),
+        ('store_unread_chat_messages', 'Unread customer chat messages.', [([], unread.count())]),
+        ('store_pending_chat_digests', 'Chat threads waiting for a staff digest email.',
+         [([], PendingNotification.objects.count())]),
+    ]
+
+
+def timed(histogram, methods=None):
+    """View decorator observing latency, labelled by outcome (status class or 'error')."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods and request.method not in methods:
+                return view(request, *args, **kwargs)
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                response = view(request, *args, **kwargs)
+                outcome = f'{response.status_code // 100}xx'
+                return response
+            finally:
+                histogram.observe(time.perf_counter() - started, outcome=outcome)
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from . import routers
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+re_accepts_br = re.compile(r'\bbr\b')
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def _compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def contains_secrets(view):
+    """Keep a view's responses uncompressed because they show credentials or access tokens.
+
+    Compressed length leaks secrets that share a body with attacker-reflected text (BREACH).
+    Gzip's random padding only slows that down, and brotli has nowhere to put padding.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        response.contains_secrets = True
+        return response
+    return wrapper
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli when the client accepts it, gzip otherwise; binary and streamed bodies pass through.
+
+    So do responses from views marked @contains_secrets.
+    """
+
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        if response.streaming or getattr(response, 'contains_secrets', False) or not _compressible(response):
+            return response
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or not re_accepts_br.search(accept):
+            return super().process_response(request, response)
+        if len(response.content) < 200 or response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class ReplicaMiddleware:
+    """Lets safe requests read from replicas, except for a short window after the client's own writes.
+
+    A successful unsafe request sets a cookie for REPLICA_STICKY_SECONDS, but never less than
+    REPLICA_MAX_LAG; while it is present (e.g. the order page after checkout, the chat poll
+    after sending a message) reads stay on the primary so the client sees what it just wrote.
+    Admin pages always use the primary.
+    """
+
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.replicas():
+            return self.get_response(request)
+        cookie = getattr(settings, 'REPLICA_STICKY_COOKIE', 'db_primary')
+        primary = (
+            request.method not in self.safe_methods
+            or cookie in request.COOKIES
+            or request.path.startswith('/admin/')
+        )
+        token = routers.pin_primary(primary)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.unpin(token)
+        if request.method not in self.safe_methods and response.status_code < 400:
+            # a replica may serve reads up to REPLICA_MAX_LAG behind, so stay pinned at least that long
+            sticky = max(getattr(settings, 'REPLICA_STICKY_SECONDS', 30),
+                         getattr(settings, 'REPLICA_MAX_LAG', 30))
+            response.set_cookie(cookie, '1', max_age=sticky, httponly=True, samesite='Lax')
+        return response
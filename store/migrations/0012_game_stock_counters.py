@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_stock_counters(apps, schema_editor):
+    Game = apps.get_model('store', 'Game')
+    GameCredential = apps.get_model('store', 'GameCredential')
+    OfflineCredentialAssignment = apps.get_model('store', 'OfflineCredentialAssignment')
+    available = dict(GameCredential.objects.values('game').annotate(n=models.Count('pk')).values_list('game', 'n'))
+    assigned = dict(OfflineCredentialAssignment.objects.values('game').annotate(n=models.Count('pk')).values_list('game', 'n'))
+    for game_id in set(available) | set(assigned):
+        Game.objects.filter(pk=game_id).update(
+            stock_available=available.get(game_id, 0),
+            stock_assigned=assigned.get(game_id, 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_merge_0006_chatmessage_image_0010_orderchat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='stock_assigned',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Credentials delivered to orders'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='stock_available',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Credentials in the pool'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='stock_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Units held in carts'),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.game')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session_key', 'game'), name='unique_reservation_per_session')],
+            },
+        ),
+        migrations.RunPython(populate_stock_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_game_stock_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='Checkout form key; guards against duplicate submits', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_snapshot',
+            field=models.JSONField(blank=True, editable=False, help_text='Grouped delivery payload built at checkout; cleared when assignments change', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_order_delivery_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
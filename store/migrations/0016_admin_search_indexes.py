@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:23
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    EmailAccessLink = apps.get_model('store', 'EmailAccessLink')
+    Order.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+    EmailAccessLink.objects.exclude(email=Lower('email')).update(email=Lower('email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_game_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailaccesslink',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='gamecredential',
+            name='username',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='email',
+            field=models.EmailField(db_index=True, help_text='Stored lowercase so lookups and admin search can use the index', max_length=254),
+        ),
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'is_read'], name='chat_sender_unread_idx'),
+        ),
+    ]
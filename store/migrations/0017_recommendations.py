@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.game')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['game', '-count'], name='copurchase_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('game', 'other'), name='unique_copurchase_pair')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GameRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='store.game')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='store.game')),
+            ],
+            options={
+                'ordering': ['game', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('game', 'rank'), name='unique_recommendation_rank')],
+            },
+        ),
+    ]
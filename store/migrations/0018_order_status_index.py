@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+    ]
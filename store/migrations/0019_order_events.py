@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_order_status_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('order.created', 'Order created'), ('order.allocated', 'Credentials allocated'), ('order.status', 'Status changed'), ('chat.message', 'Chat message')], max_length=40)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='store.order')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_order_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_message_id', models.PositiveBigIntegerField()),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('first_at', models.DateTimeField(db_index=True)),
+                ('last_at', models.DateTimeField(db_index=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pending_notification', to='store.order')),
+            ],
+        ),
+    ]
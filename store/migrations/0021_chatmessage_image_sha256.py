@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_pending_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='image_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Content hash; identical uploads share one stored file', max_length=64),
+        ),
+    ]
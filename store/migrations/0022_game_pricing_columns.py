@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:34
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_pricing(apps, schema_editor):
+    # same rules as Game.refresh_pricing at the time of this migration
+    Game = apps.get_model('store', 'Game')
+    limits = ((Decimal('10'), 'under-10'), (Decimal('25'), '10-25'), (Decimal('50'), '25-50'))
+    batch = []
+    for game in Game.objects.only('id', 'price', 'original_price').iterator(chunk_size=1000):
+        if game.original_price and game.original_price > 0 and game.original_price > game.price:
+            game.discount_percent = int(round((1 - (game.price / game.original_price)) * 100))
+        game.price_band = next((key for limit, key in limits if game.price < limit), '50-plus')
+        batch.append(game)
+        if len(batch) >= 1000:
+            Game.objects.bulk_update(batch, ['discount_percent', 'price_band'])
+            batch = []
+    Game.objects.bulk_update(batch, ['discount_percent', 'price_band'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_chatmessage_image_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='price_band',
+            field=models.CharField(blank=True, choices=[('under-10', 'Under $10'), ('10-25', '$10 to $25'), ('25-50', '$25 to $50'), ('50-plus', '$50 and up')], editable=False, max_length=10),
+        ),
+        migrations.RunPython(populate_pricing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['category', '-discount_percent'], name='game_category_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-discount_percent'], name='game_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['category', 'price_band', 'price'], name='game_category_band_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['price_band', 'price'], name='game_band_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['category', 'price'], name='game_category_price_idx'),
+        ),
+    ]
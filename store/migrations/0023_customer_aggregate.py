@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_game_pricing_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(help_text='Normalized: trimmed and lowercase', max_length=254, unique=True)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_order_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('has_open_chat', models.BooleanField(db_index=True, default=False, help_text='A chat thread is waiting for a staff reply')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='store.customer'),
+        ),
+    ]
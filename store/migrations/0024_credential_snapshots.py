@@ -0,0 +1,79 @@
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+
+
+BATCH_SIZE = 500
+
+
+def digest(username, password, notes):
+    # must match store.credentials.digest
+    raw = json.dumps([username, password, notes], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def compact_assignments(apps, schema_editor):
+    """Point every assignment at a shared snapshot, one committed batch at a time."""
+    Assignment = apps.get_model('store', 'OfflineCredentialAssignment')
+    Snapshot = apps.get_model('store', 'CredentialSnapshot')
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Assignment.objects.filter(pk__gt=last, snapshot__isnull=True).order_by('pk')
+                .values_list('pk', 'username', 'password', 'notes')[:BATCH_SIZE]
+            )
+            if not rows:
+                return
+            groups = {}
+            for pk, username, password, notes in rows:
+                content = (username, password, notes)
+                groups.setdefault(digest(*content), (content, []))[1].append(pk)
+            Snapshot.objects.bulk_create([
+                Snapshot(digest=key, username=content[0], password=content[1], notes=content[2])
+                for key, (content, _) in groups.items()
+            ], ignore_conflicts=True)
+            ids = dict(Snapshot.objects.filter(digest__in=groups).values_list('digest', 'pk'))
+            for key, (_, pks) in groups.items():
+                Assignment.objects.filter(pk__in=pks).update(snapshot_id=ids[key])
+            last = rows[-1][0]
+
+
+def expand_assignments(apps, schema_editor):
+    Assignment = apps.get_model('store', 'OfflineCredentialAssignment')
+    Snapshot = apps.get_model('store', 'CredentialSnapshot')
+    for snapshot in Snapshot.objects.iterator(chunk_size=BATCH_SIZE):
+        Assignment.objects.filter(snapshot=snapshot).update(
+            username=snapshot.username, password=snapshot.password, notes=snapshot.notes,
+        )
+
+
+class Migration(migrations.Migration):
+    # each compaction batch commits on its own so a large table isn't rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('store', '0023_customer_aggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CredentialSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(editable=False, help_text='sha256 of the content', max_length=64, unique=True)),
+                ('username', models.CharField(max_length=255)),
+                ('password', models.CharField(max_length=255)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='offlinecredentialassignment',
+            name='snapshot',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='assignments', to='store.credentialsnapshot'),
+        ),
+        migrations.RunPython(compact_assignments, expand_assignments),
+    ]
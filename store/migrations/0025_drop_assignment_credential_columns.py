@@ -0,0 +1,40 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_credential_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='offlinecredentialassignment',
+            name='snapshot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='assignments', to='store.credentialsnapshot'),
+        ),
+        # a default lets reversing this migration re-add the columns to existing rows
+        migrations.AlterField(
+            model_name='offlinecredentialassignment',
+            name='username',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='offlinecredentialassignment',
+            name='password',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.RemoveField(
+            model_name='offlinecredentialassignment',
+            name='username',
+        ),
+        migrations.RemoveField(
+            model_name='offlinecredentialassignment',
+            name='password',
+        ),
+        migrations.RemoveField(
+            model_name='offlinecredentialassignment',
+            name='notes',
+        ),
+    ]
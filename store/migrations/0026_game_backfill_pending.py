@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_drop_assignment_credential_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='backfill_pending',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Pool grew since partial orders were last backfilled'),
+        ),
+    ]
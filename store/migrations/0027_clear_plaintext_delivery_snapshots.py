@@ -0,0 +1,33 @@
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 500
+
+
+def clear_snapshots(apps, schema_editor):
+    """Drop version-1 delivery snapshots, which copied credentials into the order row.
+
+    They are rebuilt as snapshot ids on the next delivery page view.
+    """
+    Order = apps.get_model('store', 'Order')
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Order.objects.filter(delivery_snapshot__isnull=False).exclude(delivery_snapshot__v=2)
+                .order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                return
+            Order.objects.filter(pk__in=ids).update(delivery_snapshot=None)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('store', '0026_game_backfill_pending'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0027_clear_plaintext_delivery_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobcursor',
+            name='gaps',
+            field=models.JSONField(blank=True, default=dict, help_text='Skipped ids still awaiting a late commit'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0028_jobcursor_gaps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('completed', 'Completed'), ('partial', 'Partial Delivery')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,5 +1,12 @@
+from decimal import Decimal
+
 from django.db import models
 from django.core.validators import FileExtensionValidator
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .slugs import SlugAllocator
 
 
 class Game(models.Model):
@@ -8,6 +15,16 @@ class Game(models.Model):
         ('online-account', 'Online Account'),
         ('account-rent', 'Account Rent'),
     ]
+    # Categories delivered from a GameCredential pool at checkout
+    ACCOUNT_CATEGORIES = ('offline-account', 'online-account')
+    PRICE_BAND_CHOICES = [
+        ('under-10', 'Under $10'),
+        ('10-25', '$10 to $25'),
+        ('25-50', '$25 to $50'),
+        ('50-plus', '$50 and up'),
+    ]
+    # (exclusive upper bound, band); prices above the last bound are '50-plus'
+    PRICE_BAND_LIMITS = ((Decimal('10'), 'under-10'), (Decimal('25'), '10-25'), (Decimal('50'), '25-50'))
 
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=220, unique=True, blank=True, null=True)
@@ -18,45 +35,105 @@ class Game(models.Model):
     description = models.TextField(blank=True)
     instructions = models.TextField(blank=True, help_text='Optional instructions shown on delivery page for offline accounts')
     rotation_index = models.PositiveIntegerField(default=0, help_text='Round-robin pointer for offline account credentials')
+    # Denormalized stock counters, maintained by store.stock
+    stock_available = models.PositiveIntegerField(default=0, editable=False, help_text='Credentials in the pool')
+    stock_assigned = models.PositiveIntegerField(default=0, editable=False, help_text='Credentials delivered to orders')
+    stock_reserved = models.PositiveIntegerField(default=0, editable=False, help_text='Units held in carts')
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
+    backfill_pending = models.BooleanField(default=False, editable=False, db_index=True,
+                                           help_text='Pool grew since partial orders were last backfilled')
+    # Derived from price/original_price on save (and by recompute_pricing) so the catalog can sort/filter in SQL
+    discount_percent = models.PositiveSmallIntegerField(default=0, editable=False)
+    price_band = models.CharField(max_length=10, choices=PRICE_BAND_CHOICES, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-discount_percent'], name='game_category_discount_idx'),
+            models.Index(fields=['-discount_percent'], name='game_discount_idx'),
+            models.Index(fields=['category', 'price_band', 'price'], name='game_category_band_idx'),
+            models.Index(fields=['price_band', 'price'], name='game_band_price_idx'),
+            models.Index(fields=['category', 'price'], name='game_category_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     @property
-    def discount_percent(self):
+    def tracks_stock(self):
+        return self.category in self.ACCOUNT_CATEGORIES
+
+    @property
+    def in_stock(self):
+        return not self.tracks_stock or self.stock_available > 0
+
+    def refresh_pricing(self):
+        """Recompute discount_percent and price_band; returns True when either changed."""
+        discount = 0
         if self.original_price and self.original_price > 0 and self.original_price > self.price:
-            return int(round((1 - (self.price / self.original_price)) * 100))
-        return 0
+            discount = int(round((1 - (Decimal(self.price) / Decimal(self.original_price))) * 100))
+        band = self.PRICE_BAND_CHOICES[-1][0]
+        for limit, key in self.PRICE_BAND_LIMITS:
+            if Decimal(self.price) < limit:
+                band = key
+                break
+        changed = (discount, band) != (self.discount_percent, self.price_band)
+        self.discount_percent, self.price_band = discount, band
+        return changed
 
     def save(self, *args, **kwargs):
-        from django.utils.text import slugify
+        self.refresh_pricing()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'original_price'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'discount_percent', 'price_band'}
         if not self.slug:
+            # one query for every slug sharing the base, then pick the suffix in memory
             base = slugify(self.title) or 'game'
-            slug = base
-            idx = 1
-            Model = self.__class__
-            while Model.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                idx += 1
-                slug = f"{base}-{idx}"
-            self.slug = slug
+            taken = self.__class__.objects.filter(slug__startswith=base).exclude(pk=self.pk).values_list('slug', flat=True)
+            self.slug = SlugAllocator(taken).allocate(self.title)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
-        from django.urls import reverse
         return reverse('game_detail', args=[self.pk])
 
 
+class Customer(models.Model):
+    """Per-email order aggregate, kept current at checkout (see store/customers.py)."""
+    email = models.EmailField(unique=True, help_text='Normalized: trimmed and lowercase')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    has_open_chat = models.BooleanField(default=False, db_index=True,
+                                        help_text='A chat thread is waiting for a staff reply')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.email
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        # accepted by CHECKOUT_MODE = 'queued', waiting for process_checkout_queue
+        ('queued', 'Queued'),
         ('completed', 'Completed'),
         ('partial', 'Partial Delivery'),
     ]
 
-    email = models.EmailField()
+    email = models.EmailField(db_index=True, help_text='Stored lowercase so lookups and admin search can use the index')
+    customer = models.ForeignKey(Customer, related_name='orders', null=True, blank=True, on_delete=models.SET_NULL)
     name = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    delivery_snapshot = models.JSONField(null=True, blank=True, editable=False,
+                                         help_text='Grouped delivery payload built at checkout; cleared when assignments change')
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False,
+                                       help_text='Checkout form key; guards against duplicate submits')
+
+    class Meta:
+        indexes = [
+            # backfill scans partial orders oldest first
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.email}"
@@ -83,7 +160,7 @@ class OrderItem(models.Model):
 
 class GameCredential(models.Model):
     game = models.ForeignKey(Game, related_name='credentials', on_delete=models.CASCADE)
-    username = models.CharField(max_length=255)
+    username = models.CharField(max_length=255, db_index=True)
     password = models.CharField(max_length=255)
     notes = models.CharField(max_length=255, blank=True)
 
@@ -91,14 +168,39 @@ class GameCredential(models.Model):
         return f"{self.game.title} - {self.username}"
 
 
-class OfflineCredentialAssignment(models.Model):
-    order = models.ForeignKey(Order, related_name='offline_assignments', on_delete=models.CASCADE)
-    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+class CredentialSnapshot(models.Model):
+    """A credential as it was delivered. Rotation hands one credential to many orders, so
+    assignments share a row per distinct content instead of copying the strings; edits to or
+    deletion of the GameCredential never touch it (see store/credentials.py)."""
+    digest = models.CharField(max_length=64, unique=True, editable=False, help_text='sha256 of the content')
     username = models.CharField(max_length=255)
     password = models.CharField(max_length=255)
     notes = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def __str__(self):
+        return self.username
+
+
+class OfflineCredentialAssignment(models.Model):
+    order = models.ForeignKey(Order, related_name='offline_assignments', on_delete=models.CASCADE)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    snapshot = models.ForeignKey(CredentialSnapshot, related_name='assignments', on_delete=models.PROTECT)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # read through to the shared snapshot; select_related('snapshot') when listing
+    @property
+    def username(self):
+        return self.snapshot.username
+
+    @property
+    def password(self):
+        return self.snapshot.password
+
+    @property
+    def notes(self):
+        return self.snapshot.notes
+
     def __str__(self):
         return f"Order #{self.order_id} - {self.game.title} ({self.username})"
 
@@ -110,7 +212,6 @@ class DeliveryLink(models.Model):
     expires_at = models.DateTimeField()
 
     def is_valid(self):
-        from django.utils import timezone
         return timezone.now() <= self.expires_at
 
     def __str__(self):
@@ -118,13 +219,12 @@ class DeliveryLink(models.Model):
 
 
 class EmailAccessLink(models.Model):
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     token = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
     def is_valid(self):
-        from django.utils import timezone
         return timezone.now() <= self.expires_at
 
     def __str__(self):
@@ -141,16 +241,117 @@ class ChatMessage(models.Model):
     message = models.TextField(blank=True)
     image = models.FileField(upload_to='chat_uploads/%Y/%m/%d', null=True, blank=True,
                              validators=[FileExtensionValidator(['jpg', 'jpeg', 'png', 'gif', 'webp'])])
+    image_sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False,
+                                    help_text='Content hash; identical uploads share one stored file')
     is_read = models.BooleanField(default=False, help_text='Marked read by staff when viewed')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # admin unread badge polls this every few seconds
+            models.Index(fields=['sender', 'is_read'], name='chat_sender_unread_idx'),
+        ]
 
     def __str__(self):
         return f"ChatMessage(order={self.order_id}, sender={self.sender})"
 
 
+class StockReservation(models.Model):
+    game = models.ForeignKey(Game, related_name='reservations', on_delete=models.CASCADE)
+    session_key = models.CharField(max_length=40)
+    quantity = models.PositiveIntegerField(default=1)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session_key', 'game'], name='unique_reservation_per_session'),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} x{self.quantity} ({self.session_key})"
+
+
+class CoPurchase(models.Model):
+    """Co-purchase matrix cell: orders that contained both games. Stored in both directions."""
+    game = models.ForeignKey(Game, related_name='+', on_delete=models.CASCADE)
+    other = models.ForeignKey(Game, related_name='+', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'other'], name='unique_copurchase_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['game', '-count'], name='copurchase_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} + {self.other_id} x{self.count}"
+
+
+class GameRecommendation(models.Model):
+    """Precomputed top-K co-purchased games, read by game_detail."""
+    game = models.ForeignKey(Game, related_name='recommendations', on_delete=models.CASCADE)
+    recommended = models.ForeignKey(Game, related_name='recommended_for', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['game', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} -> {self.recommended_id} (#{self.rank})"
+
+
+class JobCursor(models.Model):
+    """High-water mark of an incremental background job, e.g. the last processed order id."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    # ids below position that were missing when it passed them: {id: unix time first missed}
+    gaps = models.JSONField(default=dict, blank=True, help_text='Skipped ids still awaiting a late commit')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class OrderEvent(models.Model):
+    """Append-only change log for orders, read incrementally by id (see store/events.py)."""
+    KIND_CHOICES = [
+        ('order.created', 'Order created'),
+        ('order.allocated', 'Credentials allocated'),
+        ('order.status', 'Status changed'),
+        ('chat.message', 'Chat message'),
+    ]
+    # no FK constraint: events outlive the rows they describe
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.DO_NOTHING, db_constraint=False)
+    kind = models.CharField(max_length=40, choices=KIND_CHOICES)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} (order {self.order_id})"
+
+
+class PendingNotification(models.Model):
+    """Customer chat messages waiting to go out to staff as one digest email (see store/notifications.py)."""
+    order = models.OneToOneField(Order, related_name='pending_notification', on_delete=models.CASCADE)
+    first_message_id = models.PositiveBigIntegerField()
+    count = models.PositiveIntegerField(default=1)
+    first_at = models.DateTimeField(db_index=True)
+    last_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.count} message(s) pending for order {self.order_id}"
+
+
 class OrderChat(Order):
     class Meta:
         proxy = True
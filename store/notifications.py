@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Least
+from django.urls import reverse
+from django.utils import timezone
+
+from . import mail
+from .fulfillment import site_url
+from .models import ChatMessage, PendingNotification
+
+
+def quiet_period():
+    return timedelta(seconds=getattr(settings, 'CHAT_NOTIFY_QUIET_SECONDS', 120))
+
+
+def max_delay():
+    return timedelta(seconds=getattr(settings, 'CHAT_NOTIFY_MAX_DELAY', 600))
+
+
+def recipients():
+    support_email = getattr(settings, 'SUPPORT_EMAIL', None) or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
+    return [support_email] if support_email else []
+
+
+def buffer(message, now=None):
+    """Add a customer message to its order's pending digest instead of emailing right away."""
+    now = now or timezone.now()
+    pending = PendingNotification.objects.filter(order_id=message.order_id)
+    if pending.update(count=F('count') + 1, last_at=now):
+        return
+    try:
+        with transaction.atomic():
+            PendingNotification.objects.create(
+                order_id=message.order_id, first_message_id=message.pk, first_at=now, last_at=now,
+            )
+    except IntegrityError:
+        # a concurrent message opened the digest first
+        pending.update(count=F('count') + 1, last_at=now)
+
+
+def due(now=None):
+    """Digests whose thread went quiet, or that have waited the maximum delay."""
+    now = now or timezone.now()
+    return PendingNotification.objects.filter(
+        Q(last_at__lte=now - quiet_period()) | Q(first_at__lte=now - max_delay())
+    )
+
+
+def _digest(pending, to):
+    order = pending.order
+    messages = list(
+        ChatMessage.objects.filter(order_id=order.pk, sender='customer', pk__gte=pending.first_message_id).order_by('pk')
+    )
+    lines = [f"[{timezone.localtime(m.created_at):%H:%M}] {m.message or 'Image attached'}" for m in messages]
+    body = f"From: {order.email}\nOrder ID: {order.id}\n\n" + '\n'.join(lines)
+    body += f"\n\nOpen chat: {site_url(reverse('admin:store_orderchat_change', args=[order.id]))}"
+    subject = (f"New chat message for Order #{order.id}" if len(messages) == 1
+               else f"{len(messages)} new chat messages for Order #{order.id}")
+    return EmailMessage(subject, body, None, to)
+
+
+def _send(emails, connection=None):
+    """Send each digest on one connection; returns whether each one went out."""
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        opened = connection.open()
+    except Exception:
+        # each send below retries the connect and counts its own failure
+        opened = False
+    try:
+        return [mail.send_messages([email], kind='chat_digest', connection=connection) == 1 for email in emails]
+    finally:
+        if opened:
+            connection.close()
+
+
+def _restore(pending):
+    """Put unsent digests back, merged into any digest a newer message opened meanwhile."""
+    for p in pending:
+        merge = dict(
+            first_message_id=Least(F('first_message_id'), p.first_message_id),
+            first_at=Least(F('first_at'), p.first_at),
+            count=F('count') + p.count,
+        )
+        if PendingNotification.objects.filter(order_id=p.order_id).update(**merge):
+            continue
+        try:
+            with transaction.atomic():
+                PendingNotification.objects.create(
+                    order_id=p.order_id, first_message_id=p.first_message_id, count=p.count,
+                    first_at=p.first_at, last_at=p.last_at,
+                )
+        except IntegrityError:
+            PendingNotification.objects.filter(order_id=p.order_id).update(**merge)
+
+
+def flush(now=None, connection=None, batch_size=100):
+    """Send one email per due thread and clear its digest. Returns emails sent.
+
+    A batch is claimed and deleted before sending, so no lock is held during SMTP; digests whose
+    email fails are restored and the run stops, to be retried on the next flush.
+    """
+    to = recipients()
+    sent = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                due(now).select_related('order').select_for_update(skip_locked=True, of=('self',))
+                .order_by('first_at')[:batch_size]
+            )
+            if not batch:
+                return sent
+            emails = [_digest(pending, to) for pending in batch] if to else []
+            PendingNotification.objects.filter(pk__in=[p.pk for p in batch]).delete()
+        if not emails:
+            continue
+        delivered = _send(emails, connection)
+        sent += sum(delivered)
+        if not all(delivered):
+            _restore([p for p, ok in zip(batch, delivered) if not ok])
+            return sent
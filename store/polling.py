@@ -0,0 +1,146 @@
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# (seconds since the last message, poll delay) while a thread is active; quieter threads use the fallback
+ACTIVITY_STEPS = ((30, 2), (120, 5), (600, 15))
+IDLE_DELAY = 30
+# set by templates/store/partials/poll_script.html from document.hidden
+HIDDEN_HEADER = 'X-Poll-Hidden'
+DELAY_HEADER = 'X-Poll-After'
+
+_load = {'value': 1.0, 'at': 0.0}
+
+
+def min_delay():
+    return getattr(settings, 'POLL_MIN_SECONDS', 2)
+
+
+def max_delay():
+    return getattr(settings, 'POLL_MAX_SECONDS', 60)
+
+
+def hidden_delay():
+    return getattr(settings, 'POLL_HIDDEN_SECONDS', 60)
+
+
+def load_factor(now=None):
+    """Host load average per CPU, clamped to 1..4; re-read at most every 5 seconds per process."""
+    now = time.monotonic() if now is None else now
+    if now - _load['at'] >= 5:
+        try:
+            per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):  # not available on Windows
+            per_cpu = 1.0
+        _load.update(value=min(max(per_cpu, 1.0), 4.0), at=now)
+    return _load['value']
+
+
+def activity_delay(idle):
+    if idle is None:
+        return IDLE_DELAY
+    for within, delay in ACTIVITY_STEPS:
+        if idle < within:
+            return delay
+    return IDLE_DELAY
+
+
+def next_delay(last_activity=None, hidden=False, ceiling=None, now=None, load=None, jitter=0.1, rng=random):
+    """Seconds a client should wait before polling again.
+
+    Busy threads poll fast and quiet ones back off; the delay stretches with host load,
+    is capped by `ceiling`, raised to POLL_HIDDEN_SECONDS for background tabs, and jittered
+    so tabs opened together don't poll in lockstep.
+    """
+    now = now or timezone.now()
+    idle = (now - last_activity).total_seconds() if last_activity else None
+    delay = activity_delay(idle) * (load_factor() if load is None else load)
+    if ceiling is not None:
+        delay = min(delay, ceiling)
+    if hidden:
+        delay = max(delay, hidden_delay())
+    delay = min(max(delay, min_delay()), max_delay())
+    if jitter:
+        delay *= 1 + rng.uniform(-jitter, jitter)
+    return round(max(delay, min_delay()), 1)
+
+
+def is_hidden(request):
+    return request.headers.get(HIDDEN_HEADER) == '1'
+
+
+def advise(request, response, last_activity=None, ceiling=None):
+    """Attach the recommended next-poll delay to a poll response."""
+    response.headers[DELAY_HEADER] = str(next_delay(last_activity, hidden=is_hidden(request), ceiling=ceiling))
+    return response
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _sim_client(rng, duration, active_share, hidden_share):
+    active = rng.random() < active_share
+    messages = []
+    if active:
+        # a ten-minute conversation: a message every ~20s from either side
+        t = rng.uniform(0, max(duration - 600, 0))
+        end = t + 600
+        while t < min(end, duration):
+            messages.append(t)
+            t += rng.expovariate(1 / 20)
+    elif rng.random() < 0.1:
+        # an otherwise idle tab that gets one late reply
+        messages.append(rng.uniform(0, duration))
+    hidden = rng.random() < hidden_share
+    group = f"{'active' if active else 'idle'}/{'hidden' if hidden else 'visible'}"
+    return {'messages': messages, 'hidden': hidden, 'group': group}
+
+
+def _sim_run(clients, duration, delay):
+    groups = {}
+    for client in clients:
+        r = groups.setdefault(client['group'], {'clients': 0, 'requests': 0, 'lags': []})
+        r['clients'] += 1
+        t, seen, last = 0.0, 0, None
+        messages = client['messages']
+        while t < duration:
+            r['requests'] += 1
+            while seen < len(messages) and messages[seen] <= t:
+                r['lags'].append(t - messages[seen])
+                last = messages[seen]
+                seen += 1
+            t += delay(client, last, t)
+    return groups
+
+
+def simulate(clients=1000, minutes=60, active=0.2, hidden=0.4, load=1.0, fixed=2.0, seed=1):
+    """Replay the same tabs under a fixed interval and under next_delay(); no requests are made.
+
+    Returns {'fixed': groups, 'adaptive': groups}, where groups maps 'active|idle/hidden|visible'
+    to {'clients', 'requests', 'lags'} and a lag is the seconds between a message and the poll
+    that picked it up.
+    """
+    rng = random.Random(seed)
+    duration = minutes * 60
+    tabs = [_sim_client(rng, duration, active, hidden) for _ in range(clients)]
+    base = timezone.now()
+
+    def adaptive(client, last, t):
+        return next_delay(
+            base + timedelta(seconds=last) if last is not None else None,
+            hidden=client['hidden'], now=base + timedelta(seconds=t), load=load, rng=rng,
+        )
+
+    return {
+        'fixed': _sim_run(tabs, duration, lambda client, last, t: fixed),
+        'adaptive': _sim_run(tabs, duration, adaptive),
+    }
@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CoPurchase, Game, GameRecommendation, JobCursor, Order, OrderItem
+
+
+CURSOR = 'recommendations'
+
+
+def top_k():
+    return getattr(settings, 'RECOMMENDATIONS_TOP_K', 8)
+
+
+def related_games(game, limit=4):
+    """Top co-purchased games (one indexed query), padded from the same category for cold games."""
+    related = list(
+        Game.objects.filter(recommended_for__game=game).order_by('recommended_for__rank')[:limit]
+    )
+    if len(related) < limit:
+        seen = [game.pk] + [g.pk for g in related]
+        related += Game.objects.filter(category=game.category).exclude(pk__in=seen)[:limit - len(related)]
+    return related
+
+
+def _pair_counts(rows):
+    baskets = defaultdict(set)
+    for order_id, game_id in rows:
+        baskets[order_id].add(game_id)
+    counts = Counter()
+    for games in baskets.values():
+        counts.update(permutations(games, 2))
+    return counts
+
+
+def _merge(counts):
+    games = {a for a, _ in counts}
+    existing = {
+        (cell.game_id, cell.other_id): cell
+        for cell in CoPurchase.objects.filter(game_id__in=games, other_id__in=games)
+    }
+    changed, created = [], []
+    for (a, b), n in counts.items():
+        cell = existing.get((a, b))
+        if cell is None:
+            created.append(CoPurchase(game_id=a, other_id=b, count=n))
+        else:
+            cell.count += n
+            changed.append(cell)
+    CoPurchase.objects.bulk_update(changed, ['count'], batch_size=500)
+    CoPurchase.objects.bulk_create(created, batch_size=500)
+
+
+def rebuild(game_ids, k=None):
+    """Replace the stored top-K rows for the given games from the co-purchase matrix."""
+    k = k or top_k()
+    rows = []
+    for game_id in game_ids:
+        top = (
+            CoPurchase.objects.filter(game_id=game_id)
+            .order_by('-count', 'other_id')
+            .values_list('other_id', 'count')[:k]
+        )
+        rows += [
+            GameRecommendation(game_id=game_id, recommended_id=other_id, rank=rank, score=count)
+            for rank, (other_id, count) in enumerate(top, start=1)
+        ]
+    GameRecommendation.objects.filter(game_id__in=game_ids).delete()
+    GameRecommendation.objects.bulk_create(rows, batch_size=500)
+
+
+def refresh(batch_size=1000, settle=timedelta(minutes=1), now=None, progress=None):
+    """Fold orders placed since the last run into the matrix and re-rank the games they touched.
+
+    Orders younger than `settle` are left for the next run so a checkout still committing
+    behind a higher id is not skipped. Returns (orders processed, games re-ranked).
+    """
+    now = now or timezone.now()
+    orders = games = 0
+    while True:
+        with transaction.atomic():
+            cursor, _ = JobCursor.objects.select_for_update().get_or_create(name=CURSOR)
+            order_ids = list(
+                Order.objects.filter(pk__gt=cursor.position, created_at__lte=now - settle)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            counts = _pair_counts(
+                OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'game_id')
+            )
+            if counts:
+                _merge(counts)
+                touched = {a for a, _ in counts}
+                rebuild(touched)
+                games += len(touched)
+            cursor.position = order_ids[-1]
+            cursor.save(update_fields=['position', 'updated_at'])
+        orders += len(order_ids)
+        if progress:
+            progress(orders, games)
+    return orders, games
+
+
+@transaction.atomic
+def reset():
+    """Forget the matrix so the next refresh rebuilds it from the first order."""
+    CoPurchase.objects.all().delete()
+    GameRecommendation.objects.all().delete()
+    JobCursor.objects.filter(name=CURSOR).delete()
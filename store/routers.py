@@ -0,0 +1,89 @@
+import contextvars
+import itertools
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Reads go to the primary unless something (ReplicaMiddleware) explicitly allows replicas,
+# so management commands and background jobs never act on stale rows.
+_use_primary = contextvars.ContextVar('use_primary', default=True)
+
+# models whose reads must always see the latest write
+PRIMARY_APPS = {'sessions', 'auth', 'admin', 'contenttypes'}
+
+_health = {}
+_round_robin = itertools.count()
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def pin_primary(value=True):
+    """Route this context's reads to the primary (True) or allow replicas (False). Returns a reset token."""
+    return _use_primary.set(value)
+
+
+def unpin(token):
+    _use_primary.reset(token)
+
+
+def _probe(alias):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # the last replayed commit ages on an idle primary too; a replica that has replayed
+            # everything it received is caught up however old that commit is
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+            )
+            lag = cursor.fetchone()[0]
+            return lag <= getattr(settings, 'REPLICA_MAX_LAG', 30)
+        # fails on an empty or half-copied stand-in replica as well as a dead one
+        cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        return True
+
+
+def is_healthy(alias, now=None):
+    """Cached per process for REPLICA_HEALTH_INTERVAL seconds; a failed or lagging probe marks it down."""
+    now = time.monotonic() if now is None else now
+    cached = _health.get(alias)
+    if cached and now - cached[1] < getattr(settings, 'REPLICA_HEALTH_INTERVAL', 5):
+        return cached[0]
+    try:
+        healthy = _probe(alias)
+    except Exception:
+        healthy = False
+    _health[alias] = (healthy, now)
+    return healthy
+
+
+class ReplicaRouter:
+    """Sends safe reads to a healthy replica, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _use_primary.get() or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        # a read inside a transaction must see that transaction's writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        candidates = replicas()
+        for _ in range(len(candidates)):
+            alias = candidates[next(_round_robin) % len(candidates)]
+            if is_healthy(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the schema through replication
+        return db == DEFAULT_DB_ALIAS
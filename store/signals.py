@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import delivery, fulfillment, stock
+from .models import Game, GameCredential, OfflineCredentialAssignment, OrderItem
+
+
+@receiver(pre_save, sender=Game)
+def game_pricing(sender, instance, raw=False, **kwargs):
+    # fixtures bypass Game.save(); keep the derived pricing columns right for them too
+    if raw:
+        instance.refresh_pricing()
+
+
+@receiver(pre_save, sender=GameCredential)
+def credential_moving(sender, instance, raw=False, **kwargs):
+    # remember the previous game so a credential moved between games updates both pools
+    instance._stock_previous_game_id = None
+    if instance.pk and not raw:
+        instance._stock_previous_game_id = (
+            sender.objects.filter(pk=instance.pk).values_list('game_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=GameCredential)
+def credential_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_stock_previous_game_id', None)
+    if created:
+        stock.adjust(instance.game_id, available=1)
+    elif previous and previous != instance.game_id:
+        stock.adjust(previous, available=-1)
+        stock.adjust(instance.game_id, available=1)
+    else:
+        return
+    if getattr(settings, 'BACKFILL_ON_RESTOCK', True) and not kwargs.get('raw'):
+        # the pool grew: flag it for the backfill worker rather than allocating inside this request
+        fulfillment.flag_restock(instance.game_id)
+
+
+@receiver(post_delete, sender=GameCredential)
+def credential_deleted(sender, instance, **kwargs):
+    stock.adjust(instance.game_id, available=-1)
+
+
+@receiver(post_save, sender=OfflineCredentialAssignment)
+def assignment_saved(sender, instance, created, **kwargs):
+    if created:
+        stock.adjust(instance.game_id, assigned=1)
+    delivery.invalidate(instance.order_id)
+
+
+@receiver(post_delete, sender=OfflineCredentialAssignment)
+def assignment_deleted(sender, instance, **kwargs):
+    stock.adjust(instance.game_id, assigned=-1)
+    delivery.invalidate(instance.order_id)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    delivery.invalidate(instance.order_id)
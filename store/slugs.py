@@ -0,0 +1,28 @@
+from django.utils.text import slugify
+
+
+class SlugAllocator:
+    """Hands out unique slugs against a set of taken ones, entirely in memory.
+
+    The next free suffix is remembered per base, so many titles that share a
+    base (e.g. "GTA V" variants) cost O(1) each instead of rescanning.
+    """
+
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        self._next = {}
+
+    def allocate(self, title, max_length=220):
+        # leave room for a "-NNNN" suffix within the SlugField length
+        base = slugify(title)[:max_length - 8].strip('-') or 'game'
+        idx = self._next.get(base, 1)
+        slug = base if idx == 1 else f"{base}-{idx}"
+        while slug in self.taken:
+            idx += 1
+            slug = f"{base}-{idx}"
+        self._next[base] = idx
+        self.taken.add(slug)
+        return slug
+
+    def claim(self, slug):
+        self.taken.add(slug)
@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
+
+from .models import Game, GameCredential, OfflineCredentialAssignment, StockReservation
+
+
+COUNTERS = {
+    'available': 'stock_available',
+    'assigned': 'stock_assigned',
+    'reserved': 'stock_reserved',
+}
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+
+
+def adjust(game_id, **deltas):
+    """Apply counter deltas, e.g. adjust(game_id, available=1, reserved=-2), in one UPDATE."""
+    changes = {}
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        field = COUNTERS[name]
+        if delta > 0:
+            changes[field] = F(field) + delta
+        else:
+            # never let a counter drift below zero
+            changes[field] = Greatest(F(field) - (-delta), 0)
+    if deltas.get('available'):
+        # availability is rendered on catalog cards; move the catalog version
+        changes['updated_at'] = Now()
+    if changes:
+        Game.objects.filter(pk=game_id).update(**changes)
+
+
+@transaction.atomic
+def expire_reservations(now=None):
+    """Drop reservations past their TTL and release their units. Returns rows removed."""
+    now = now or timezone.now()
+    expired = list(
+        StockReservation.objects.select_for_update()
+        .filter(expires_at__lte=now)
+        .values_list('id', 'game_id', 'quantity')
+    )
+    if not expired:
+        return 0
+    released = {}
+    for _, game_id, qty in expired:
+        released[game_id] = released.get(game_id, 0) + qty
+    StockReservation.objects.filter(id__in=[row[0] for row in expired]).delete()
+    for game_id, qty in released.items():
+        adjust(game_id, reserved=-qty)
+    return len(expired)
+
+
+@transaction.atomic
+def reserve_cart(session_key, items, now=None):
+    """Make the session's reservations match the cart items built by views._cart_totals."""
+    if not session_key:
+        return
+    now = now or timezone.now()
+    expire_reservations(now)
+    expires_at = now + reservation_ttl()
+    wanted = {it['game'].pk: it['qty'] for it in items}
+    existing = {
+        r.game_id: r
+        for r in StockReservation.objects.select_for_update().filter(session_key=session_key)
+    }
+    for game_id, res in existing.items():
+        if game_id not in wanted:
+            res.delete()
+            adjust(game_id, reserved=-res.quantity)
+    for game_id, qty in wanted.items():
+        res = existing.get(game_id)
+        if res is None:
+            StockReservation.objects.create(game_id=game_id, session_key=session_key, quantity=qty, expires_at=expires_at)
+            adjust(game_id, reserved=qty)
+            continue
+        delta = qty - res.quantity
+        res.quantity = qty
+        res.expires_at = expires_at
+        res.save(update_fields=['quantity', 'expires_at'])
+        adjust(game_id, reserved=delta)
+
+
+def release_cart(session_key):
+    """Release every reservation held by a session (checkout done or cart cleared)."""
+    if session_key:
+        reserve_cart(session_key, [])
+
+
+def recount(games=None):
+    """Recompute all counters from the source tables; used to repair drift."""
+    games = Game.objects.all() if games is None else games
+    credentials = (
+        GameCredential.objects.filter(game=OuterRef('pk'))
+        .order_by().values('game').annotate(n=Count('pk')).values('n')
+    )
+    assignments = (
+        OfflineCredentialAssignment.objects.filter(game=OuterRef('pk'))
+        .order_by().values('game').annotate(n=Count('pk')).values('n')
+    )
+    reservations = (
+        StockReservation.objects.filter(game=OuterRef('pk'), expires_at__gt=timezone.now())
+        .order_by().values('game').annotate(n=Sum('quantity')).values('n')
+    )
+    zero = Value(0, output_field=IntegerField())
+    return games.update(
+        stock_available=Coalesce(Subquery(credentials, output_field=IntegerField()), zero),
+        stock_assigned=Coalesce(Subquery(assignments, output_field=IntegerField()), zero),
+        stock_reserved=Coalesce(Subquery(reservations, output_field=IntegerField()), zero),
+        updated_at=Now(),
+    )
@@ -0,0 +1,21 @@
+from django import template
+
+from store import images
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumb(source, width):
+    """Proxied WebP URL for an external image, or the original URL when the proxy is off."""
+    if not source or not images.enabled():
+        return source
+    return images.proxy_url(source, width)
+
+
+@register.simple_tag
+def thumb_srcset(source):
+    if not source or not images.enabled():
+        return ''
+    return images.srcset(source)
@@ -0,0 +1,16 @@
+from decimal import Decimal
+
+from store.models import Game, GameCredential, Order, OrderItem
+
+
+def make_game(title='Test Game', category='offline-account', price='9.99', credentials=0):
+    game = Game.objects.create(title=title, category=category, price=Decimal(price))
+    for n in range(credentials):
+        GameCredential.objects.create(game=game, username=f'{game.pk}-user{n}', password='secret')
+    return game
+
+
+def make_order(game, quantity=1, email='buyer@example.com', status='pending'):
+    order = Order.objects.create(email=email, status=status)
+    OrderItem.objects.create(order=order, game=game, quantity=quantity, unit_price=game.price)
+    return order
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store import credentials, events
+from store.models import ChatMessage, Customer, OfflineCredentialAssignment
+
+from .helpers import make_game, make_order
+
+
+class ChangelistQueryTests(TestCase):
+    """Each changelist page costs a fixed number of queries however many rows it shows."""
+
+    pages = [
+        'store_order', 'store_gamecredential', 'store_offlinecredentialassignment', 'store_customer',
+        'store_chatmessage', 'store_orderevent', 'store_orderchat', 'store_credentialsnapshot',
+    ]
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        self.game = make_game(credentials=1)
+        self.count = 0
+
+    def add_rows(self, n):
+        for _ in range(n):
+            self.count += 1
+            email = f'buyer{self.count}@example.com'
+            order = make_order(self.game, email=email, status='completed')
+            order.customer = Customer.objects.create(email=email)
+            order.save(update_fields=['customer'])
+            content = (f'user{self.count}', 'pw', '')
+            OfflineCredentialAssignment.objects.create(
+                order=order, game=self.game, snapshot_id=credentials.snapshot_ids([content])[content],
+            )
+            ChatMessage.objects.create(order=order, sender='customer', message='hello')
+            events.record('order.created', order.pk)
+
+    def test_each_page_has_a_fixed_query_budget(self):
+        # session, user, paginator count, the page itself; nothing per row
+        self.add_rows(22)
+        for page in self.pages:
+            with self.subTest(page=page), self.assertNumQueries(4):
+                self.assertEqual(self.client.get(reverse(f'admin:{page}_changelist')).status_code, 200)
+
+    def test_order_totals_need_no_group_by(self):
+        self.add_rows(3)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:store_order_changelist'))
+        self.assertContains(response, '9.99')
+        page_query = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT "store_order"."id"'))
+        self.assertNotIn('JOIN', page_query)
+        self.assertNotIn('GROUP BY "store_order"', page_query)
+
+
+    def test_chat_list_needs_no_group_by(self):
+        self.add_rows(2)
+        quiet = make_order(self.game, email='quiet@example.com')
+        first = ChatMessage.objects.filter(sender='customer').first()
+        first.is_read = True
+        first.save(update_fields=['is_read'])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:store_orderchat_changelist'))
+        rows = list(response.context['cl'].result_list)
+        # only orders with messages, newest conversation first
+        self.assertEqual([o.email for o in rows], ['buyer2@example.com', 'buyer1@example.com'])
+        self.assertNotIn(quiet, rows)
+        self.assertEqual([o.unread for o in rows], [1, 0])
+        page_query = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT "store_order"."id"'))
+        self.assertNotIn('JOIN', page_query)
+        self.assertNotIn('GROUP BY "store_order"', page_query)
+
+
+class AdminSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('staff', 'staff@example.com', 'pw'))
+
+    def search_params(self, page, term):
+        response = self.client.get(reverse(f'admin:{page}_changelist'), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'].queryset.query.sql_with_params()[1]
+
+    def test_email_prefix_is_lowercased(self):
+        self.assertIn('buyer%', self.search_params('store_order', 'Buyer'))
+
+    def test_username_prefix_keeps_its_case(self):
+        params = self.search_params('store_gamecredential', 'AliceSmith')
+        self.assertIn('AliceSmith%', params)
+        self.assertNotIn('alicesmith%', params)
@@ -0,0 +1,38 @@
+import threading
+
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from store.models import Order
+
+from .helpers import make_game
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', THROTTLE_ENABLED=False)
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_same_key_from_two_threads_creates_one_order(self):
+        game = make_game(credentials=2)
+        clients = [Client(), Client()]
+        for client in clients:
+            client.post(reverse('cart_add', args=[game.pk]))
+        barrier = threading.Barrier(len(clients))
+        responses = [None] * len(clients)
+
+        def submit(i):
+            try:
+                barrier.wait()
+                responses[i] = clients[i].post(reverse('checkout'), {'email': 'buyer@example.com', 'idempotency_key': 'same-key'})
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(clients))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        order = Order.objects.get()
+        self.assertEqual([r.status_code for r in responses], [302, 302])
+        self.assertEqual({r.url for r in responses}, {reverse('order_success', args=[order.pk])})
+        self.assertEqual(order.offline_assignments.count(), 1)
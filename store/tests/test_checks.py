@@ -0,0 +1,32 @@
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from store.checks import static_manifest_check
+
+MANIFEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+}
+PLAIN_STORAGES = {
+    **MANIFEST_STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class StaticManifestCheckTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def test_warns_until_the_manifest_exists(self):
+        with override_settings(STORAGES=MANIFEST_STORAGES, STATIC_ROOT=self.root, USE_BUILT_ASSETS=True):
+            self.assertEqual([w.id for w in static_manifest_check(None)], ['store.W001'])
+            (self.root / 'staticfiles.json').write_text('{"paths": {}, "version": "1.1"}')
+            self.assertEqual(static_manifest_check(None), [])
+
+    def test_plain_storage_needs_no_manifest(self):
+        with override_settings(STORAGES=PLAIN_STORAGES, STATIC_ROOT=self.root):
+            self.assertEqual(static_manifest_check(None), [])
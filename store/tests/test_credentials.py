@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from store import credentials, delivery, routers
+from store.models import CredentialSnapshot, OfflineCredentialAssignment, Order
+
+from .helpers import make_game, make_order
+
+
+class AssignmentAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        self.game = make_game()
+        self.order = make_order(self.game, status='partial')
+
+    def post(self, url, **content):
+        return self.client.post(url, {'order': self.order.pk, 'game': self.game.pk, 'notes': '', **content})
+
+    def test_add_resolves_content_to_a_shared_snapshot(self):
+        response = self.post(reverse('admin:store_offlinecredentialassignment_add'), username='u1', password='p1')
+        self.assertEqual(response.status_code, 302)
+        assignment = OfflineCredentialAssignment.objects.get(order=self.order)
+        self.assertEqual((assignment.username, assignment.password), ('u1', 'p1'))
+        self.post(reverse('admin:store_offlinecredentialassignment_add'), username='u1', password='p1')
+        self.assertEqual(CredentialSnapshot.objects.count(), 1)
+
+    def test_edit_moves_to_a_new_snapshot_and_keeps_the_old_one(self):
+        content = ('u1', 'p1', '')
+        old = credentials.snapshot_ids([content])[content]
+        assignment = OfflineCredentialAssignment.objects.create(order=self.order, game=self.game, snapshot_id=old)
+        url = reverse('admin:store_offlinecredentialassignment_change', args=[assignment.pk])
+        self.assertContains(self.client.get(url), 'value="u1"')
+        self.post(url, username='u2', password='p2')
+        assignment.refresh_from_db()
+        self.assertNotEqual(assignment.snapshot_id, old)
+        self.assertEqual(assignment.username, 'u2')
+        self.assertTrue(CredentialSnapshot.objects.filter(pk=old).exists())
+
+
+class DeliveryPayloadTests(TestCase):
+    def test_stored_payload_holds_snapshot_ids_not_credentials(self):
+        game = make_game()
+        order = make_order(game)
+        content = ('user', 'hunter2', 'note')
+        snapshot_id = credentials.snapshot_ids([content])[content]
+        OfflineCredentialAssignment.objects.create(order=order, game=game, snapshot_id=snapshot_id)
+
+        payload = delivery.get_payload(order)
+        self.assertEqual(payload['games'][0]['credentials'],
+                         [{'username': 'user', 'password': 'hunter2', 'notes': 'note'}])
+        stored = Order.objects.get(pk=order.pk).delivery_snapshot
+        self.assertEqual(stored['games'][0]['snapshots'], [snapshot_id])
+        self.assertNotIn('hunter2', str(stored))
+
+    def test_rebuild_reads_the_primary_even_when_replicas_are_allowed(self):
+        order = make_order(make_game())
+        seen = []
+        build = delivery.build_payload
+
+        def spy(o):
+            seen.append(routers._use_primary.get())
+            return build(o)
+
+        token = routers.pin_primary(False)
+        try:
+            with mock.patch.object(delivery, 'build_payload', spy):
+                delivery.get_payload(order)
+        finally:
+            routers.unpin(token)
+        self.assertEqual(seen, [True])
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Customer, EmailAccessLink, Order
+
+from .helpers import make_game, make_order
+
+
+class OrderAdminCustomerTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        self.game = make_game(price='5.00')
+
+    def add_order(self, email, quantity=1):
+        return self.client.post(reverse('admin:store_order_add'), {
+            'email': email, 'name': '', 'status': 'completed', 'customer': '',
+            'items-TOTAL_FORMS': '1', 'items-INITIAL_FORMS': '0',
+            'items-0-game': self.game.pk, 'items-0-quantity': quantity, 'items-0-unit_price': '5.00',
+        })
+
+    def test_added_order_is_linked_and_counted(self):
+        self.assertEqual(self.add_order('Buyer@Example.com ', quantity=2).status_code, 302)
+        customer = Customer.objects.get(email='buyer@example.com')
+        self.assertEqual(customer.orders.get().email, 'buyer@example.com')
+        self.assertEqual((customer.order_count, customer.lifetime_spend), (1, Decimal('10.00')))
+
+    def test_changing_the_email_moves_the_order_and_recounts_both(self):
+        self.add_order('first@example.com')
+        order = Order.objects.get()
+        self.client.post(reverse('admin:store_order_change', args=[order.pk]), {
+            'email': 'second@example.com', 'name': '', 'status': 'completed', 'customer': order.customer_id,
+            'items-TOTAL_FORMS': '1', 'items-INITIAL_FORMS': '1',
+            'items-0-id': order.items.get().pk, 'items-0-order': order.pk,
+            'items-0-game': self.game.pk, 'items-0-quantity': 1, 'items-0-unit_price': '5.00',
+        })
+        self.assertEqual(Customer.objects.get(email='first@example.com').order_count, 0)
+        self.assertEqual(Customer.objects.get(email='second@example.com').order_count, 1)
+
+    def test_delete_recounts_the_customer(self):
+        self.add_order('buyer@example.com')
+        self.add_order('buyer@example.com')
+        order = Order.objects.first()
+        self.client.post(reverse('admin:store_order_delete', args=[order.pk]), {'post': 'yes'})
+        self.assertEqual(Customer.objects.get().order_count, 1)
+        self.client.post(reverse('admin:store_order_changelist'), {
+            'action': 'delete_selected', '_selected_action': list(Order.objects.values_list('pk', flat=True)),
+            'post': 'yes',
+        })
+        customer = Customer.objects.get()
+        self.assertEqual((customer.order_count, customer.lifetime_spend), (0, Decimal('0')))
+
+
+class PurchasesPageTests(TestCase):
+    def test_lists_orders_not_linked_to_the_customer(self):
+        game = make_game(title='Unlinked Game')
+        make_order(game, email='buyer@example.com', status='completed')
+        Customer.objects.create(email='buyer@example.com')
+        link = EmailAccessLink.objects.create(email='buyer@example.com', token='t',
+                                              expires_at=timezone.now() + timedelta(hours=1))
+        self.assertContains(self.client.get(reverse('purchases_page', args=[link.token])), 'Unlinked Game')
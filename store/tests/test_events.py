@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store import events
+from store.models import JobCursor, OrderEvent
+
+from .helpers import make_game, make_order
+
+
+class ConsumeTests(TestCase):
+    def setUp(self):
+        self.seen = []
+        self.order = make_order(make_game())
+        OrderEvent.objects.all().delete()
+
+    def consume(self, **kwargs):
+        return events.consume('test', lambda batch: self.seen.extend(e.pk for e in batch), **kwargs)
+
+    def test_late_commit_below_the_cursor_is_still_delivered(self):
+        first = events.record('order.created', self.order.pk)
+        # stands in for a transaction that took an id and has not committed yet
+        in_flight = events.record('order.created', self.order.pk)
+        stored = OrderEvent.objects.get(pk=in_flight.pk)
+        in_flight.delete()
+        third = events.record('order.created', self.order.pk)
+
+        self.assertEqual(self.consume(), 2)
+        self.assertEqual(self.seen, [first.pk, third.pk])
+        self.assertEqual(list(JobCursor.objects.get().gaps), [str(stored.pk)])
+
+        stored.save(force_insert=True)
+        self.assertEqual(self.consume(), 1)
+        self.assertEqual(self.seen, [first.pk, third.pk, stored.pk])
+        self.assertEqual(JobCursor.objects.get().gaps, {})
+
+    def test_gaps_expire_and_hold_back_compaction_until_then(self):
+        events.record('order.created', self.order.pk)
+        events.record('order.created', self.order.pk).delete()
+        last = events.record('order.created', self.order.pk)
+        self.consume()
+        cursor = JobCursor.objects.get()
+        gap = int(next(iter(cursor.gaps)))
+        OrderEvent.objects.update(created_at=timezone.now() - timedelta(days=100))
+        self.assertEqual(events.compact(timedelta(days=90)), 1)
+        self.assertEqual(OrderEvent.objects.filter(pk__gt=gap).count(), 1)
+
+        self.consume(gap_timeout=timedelta(0))
+        self.assertEqual(JobCursor.objects.get().gaps, {})
+        self.assertEqual(JobCursor.objects.get().position, last.pk)
+
+    def test_kind_filter_does_not_turn_other_kinds_into_gaps(self):
+        events.record('chat.message', self.order.pk)
+        wanted = events.record('order.status', self.order.pk)
+        self.consume(kinds=['order.status'])
+        self.assertEqual(self.seen, [wanted.pk])
+        self.assertEqual(JobCursor.objects.get().gaps, {})
+
+
+class AdminAllocationEventTests(TestCase):
+    def test_assignment_added_in_admin_records_an_event(self):
+        self.client.force_login(get_user_model().objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        game = make_game()
+        order = make_order(game, status='partial')
+        self.client.post(reverse('admin:store_offlinecredentialassignment_add'), {
+            'order': order.pk, 'game': game.pk, 'username': 'u', 'password': 'p', 'notes': '',
+        })
+        event = OrderEvent.objects.get(kind='order.allocated')
+        self.assertEqual((event.order_id, event.data['game'], event.data['by']), (order.pk, game.pk, 'staff'))
@@ -0,0 +1,61 @@
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store import fulfillment
+from store.models import Game, GameCredential, OfflineCredentialAssignment, Order
+
+from .helpers import make_game, make_order
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class RestockBackfillTests(TestCase):
+    def test_adding_a_credential_only_flags_the_game(self):
+        game = make_game()
+        order = make_order(game, status='partial')
+        with self.captureOnCommitCallbacks(execute=True):
+            GameCredential.objects.create(game=game, username='new', password='pw')
+        self.assertTrue(Game.objects.get(pk=game.pk).backfill_pending)
+        self.assertFalse(OfflineCredentialAssignment.objects.filter(order=order).exists())
+
+    def test_worker_pass_completes_flagged_games_and_clears_the_flag(self):
+        game = make_game()
+        order = make_order(game, quantity=2, status='partial')
+        GameCredential.objects.create(game=game, username='new', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = fulfillment.backfill_restocked()
+        self.assertEqual(stats.fulfilled, 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'completed')
+        self.assertEqual(order.offline_assignments.count(), 2)
+        self.assertFalse(Game.objects.get(pk=game.pk).backfill_pending)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNone(fulfillment.backfill_restocked())
+
+    def test_a_second_backfill_allocates_nothing_more(self):
+        game = make_game(credentials=1)
+        order = make_order(game, quantity=2, status='partial')
+        fulfillment.backfill([game.pk], notify=False)
+        stats = fulfillment.backfill([game.pk], notify=False)
+        self.assertEqual(stats.scanned, 0)
+        self.assertEqual(order.offline_assignments.count(), 2)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class StaleStockCounterTests(TestCase):
+    def test_backfill_allocates_when_the_counter_says_empty(self):
+        game = make_game(credentials=1)
+        order = make_order(game, status='partial')
+        Game.objects.filter(pk=game.pk).update(stock_available=0)
+        fulfillment.backfill([game.pk], notify=False)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'completed')
+
+    def test_checkout_allocates_when_the_counter_says_empty(self):
+        game = make_game(credentials=1)
+        self.client.post(reverse('cart_add', args=[game.pk]))
+        Game.objects.filter(pk=game.pk).update(stock_available=0)
+        self.client.post(reverse('checkout'), {'email': 'buyer@example.com', 'idempotency_key': 'k'})
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'completed')
+        self.assertEqual(order.offline_assignments.count(), 1)
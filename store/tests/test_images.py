@@ -0,0 +1,137 @@
+import io
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
+
+from django.test import TestCase, override_settings
+
+from store import images
+
+if images.Image:
+    from PIL import Image
+
+
+def png(width, height, color):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(out, 'PNG')
+    return out.getvalue()
+
+
+class StubImageServer:
+    """Serves one image at /img.png with an ETag and honours If-None-Match."""
+
+    def __init__(self):
+        self.body, self.etag, self.requests = b'', '"v1"', []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(dict(self.headers))
+                if self.headers.get('If-None-Match') == stub.etag:
+                    self.send_response(304)
+                    self.send_header('ETag', stub.etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('ETag', stub.etag)
+                self.send_header('Content-Length', str(len(stub.body)))
+                self.end_headers()
+                self.wfile.write(stub.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/img.png'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@skipUnless(images.Image, 'needs Pillow')
+class ImageProxyTests(TestCase):
+    def setUp(self):
+        self.stub = StubImageServer()
+        self.addCleanup(self.stub.close)
+        self.stub.body = png(800, 400, 'red')
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        overrides = override_settings(IMAGE_CACHE_ROOT=root, IMAGE_PROXY_WIDTHS=(320, 1280), IMAGE_PROXY_ENABLED=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def variant(self, width):
+        with Image.open(images.variant_path(images.url_hash(self.stub.url), width)) as img:
+            return img.format, img.size, img.getpixel((0, 0))
+
+    def test_renders_each_width_without_upscaling(self):
+        images.ensure_variants(self.stub.url)
+        self.assertEqual(self.variant(320)[:2], ('WEBP', (320, 160)))
+        self.assertEqual(self.variant(1280)[1], (800, 400))
+        images.ensure_variants(self.stub.url)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_refresh_revalidates_with_the_stored_etag(self):
+        images.ensure_variants(self.stub.url)
+        images.ensure_variants(self.stub.url, refresh=True)
+        self.assertEqual(self.stub.requests[-1].get('If-None-Match'), '"v1"')
+        self.assertEqual(self.variant(320)[1], (320, 160))
+
+        self.stub.body, self.stub.etag = png(800, 400, 'blue'), '"v2"'
+        images.ensure_variants(self.stub.url, refresh=True)
+        self.assertGreater(self.variant(320)[2][2], 200)
+
+    @override_settings(IMAGE_PROXY_MAX_BYTES=100)
+    def test_refuses_oversized_sources(self):
+        with self.assertRaises(ValueError):
+            images.ensure_variants(self.stub.url)
+
+    def test_view_caches_for_a_bounded_time_and_revalidates_after_a_refresh(self):
+        url = images.proxy_url(self.stub.url, 320)
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/webp'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.stub.body, self.stub.etag = png(800, 400, 'blue'), '"v2"'
+        images.ensure_variants(self.stub.url, refresh=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_view_rejects_unsigned_urls_and_falls_back_when_the_source_fails(self):
+        self.assertEqual(self.client.get('/img/320/not-a-token/').status_code, 404)
+        self.stub.close()
+        response = self.client.get(images.proxy_url(self.stub.url, 320))
+        self.assertRedirects(response, self.stub.url, fetch_redirect_response=False)
+
+    def test_failed_source_is_not_refetched_until_its_retry_time(self):
+        url = images.proxy_url(self.stub.url, 320)
+        self.stub.body = b'not an image'
+        self.assertRedirects(self.client.get(url), self.stub.url, fetch_redirect_response=False)
+        meta = images._read_meta(images.url_hash(self.stub.url))
+        self.assertIn('error', meta)
+        self.assertAlmostEqual(meta['retry_at'] - meta['failed_at'], 300)
+        # backing off: redirected straight away, the source is not asked again
+        self.assertRedirects(self.client.get(url), self.stub.url, fetch_redirect_response=False)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertFalse(images.retry_pending(self.stub.url, now=meta['retry_at'] + 1))
+
+    @override_settings(IMAGE_PROXY_RETRY_SECONDS=0)
+    def test_source_recovers_after_its_retry_time(self):
+        url = images.proxy_url(self.stub.url, 320)
+        self.stub.body = b'not an image'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.stub.body = png(800, 400, 'red')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(self.stub.requests), 2)
+        meta = images._read_meta(images.url_hash(self.stub.url))
+        self.assertNotIn('retry_at', meta)
+        self.assertIn('fetched_at', meta)
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from store.importer import import_games
+from store.models import Game
+from store.slugs import SlugAllocator
+
+
+def row(title='Test Game', price='9.99', **extra):
+    return {'title': title, 'price': price, 'category': 'offline-account', **extra}
+
+
+class SlugAllocatorTests(SimpleTestCase):
+    def test_repeated_titles_get_numbered(self):
+        allocator = SlugAllocator()
+        self.assertEqual([allocator.allocate('GTA V') for _ in range(3)], ['gta-v', 'gta-v-2', 'gta-v-3'])
+
+    def test_skips_taken_and_claimed_slugs(self):
+        allocator = SlugAllocator({'gta-v', 'gta-v-2'})
+        allocator.claim('gta-v-3')
+        self.assertEqual(allocator.allocate('GTA V'), 'gta-v-4')
+        # titles that slugify alike share the counter
+        self.assertEqual(allocator.allocate('GTA: V'), 'gta-v-5')
+
+    def test_long_and_empty_titles(self):
+        allocator = SlugAllocator()
+        slugs = [allocator.allocate('x' * 300) for _ in range(2)]
+        self.assertTrue(all(len(slug) <= 220 for slug in slugs))
+        self.assertNotEqual(*slugs)
+        self.assertEqual(allocator.allocate('???'), 'game')
+
+
+class ImportGamesTests(TestCase):
+    def test_reimport_updates_by_slug(self):
+        stats = import_games([row(slug='portal'), row(title='Portal 2')])
+        self.assertEqual((stats.created, stats.updated), (2, 0))
+        stats = import_games([row(title='Portal (GOTY)', price='4.99', slug='portal')])
+        self.assertEqual((stats.created, stats.updated), (0, 1))
+        game = Game.objects.get(slug='portal')
+        self.assertEqual((game.title, game.price), ('Portal (GOTY)', Decimal('4.99')))
+        self.assertEqual(Game.objects.count(), 2)
+
+    def test_rows_without_slug_never_overwrite(self):
+        Game.objects.create(title='Portal', slug='portal', category='offline-account', price=Decimal('1.00'))
+        import_games([row(title='Portal'), row(title='Portal')])
+        self.assertEqual(sorted(Game.objects.values_list('slug', flat=True)), ['portal', 'portal-2', 'portal-3'])
+        self.assertEqual(Game.objects.get(slug='portal').price, Decimal('1.00'))
+
+    def test_repeated_slug_in_one_batch_keeps_last(self):
+        stats = import_games([row(price='1.00', slug='dup'), row(price='2.00', slug='dup')], batch_size=10)
+        self.assertEqual(stats.rows, 2)
+        self.assertEqual(Game.objects.get(slug='dup').price, Decimal('2.00'))
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        rows = [
+            row(title='Good'),
+            row(title='Too many digits', price='123456789.99'),
+            row(title='Too many places', price='1.999'),
+            row(title='Bad original', original_price='NaN'),
+            row(title='Bad slug', slug='not a slug!'),
+            row(title='Long slug', slug='x' * 221),
+            row(title='t' * 201),
+            row(title='Also good', slug='also-good'),
+        ]
+        stats = import_games(rows, batch_size=100)
+        self.assertEqual(stats.created, 2)
+        self.assertEqual(stats.skipped, 6)
+        self.assertEqual([line for line, _ in stats.errors], [2, 3, 4, 5, 6, 7])
+        self.assertIn('digits', stats.errors[0][1])
+        self.assertIn('invalid slug', stats.errors[3][1])
+        self.assertEqual(sorted(Game.objects.values_list('title', flat=True)), ['Also good', 'Good'])
@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from store import metrics
+
+
+@override_settings(METRICS_DIR='')
+class RegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_metric_subclasses_must_implement_state(self):
+        class Incomplete(metrics.Metric):
+            def samples(self, merged):
+                return iter(())
+
+        with self.assertRaises(TypeError):
+            Incomplete(self.registry, 'incomplete', 'No state.')
+
+    @override_settings(METRICS_MAX_SERIES=2)
+    def test_label_sets_past_the_limit_fold_into_other(self):
+        counter = metrics.Counter(self.registry, 'test_allocated', 'Allocated.', ['game'])
+        for game in ('a', 'b', 'c', 'd', 'a'):
+            counter.inc(game=game)
+        self.assertEqual(counter.values, {('a',): 2, ('b',): 1, ('other',): 2})
+
+        histogram = metrics.Histogram(self.registry, 'test_seconds', 'Seconds.', ['game'], buckets=(1,))
+        for game in ('a', 'b', 'c'):
+            histogram.observe(0.5, game=game)
+        self.assertEqual(set(histogram.values), {('a',), ('b',), ('other',)})
+        self.assertIn('test_seconds_count{game="other"} 1', self.registry.render())
+
+
+class MetricsViewTests(TestCase):
+    @override_settings(METRICS_TOKEN='', METRICS_PUBLIC=False, DEBUG=False)
+    def test_denied_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', METRICS_PUBLIC=True, DEBUG=False)
+    def test_public_opt_in(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '# TYPE store_checkout_seconds histogram')
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_PUBLIC=True)
+    def test_token_is_required_once_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
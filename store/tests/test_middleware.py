@@ -0,0 +1,123 @@
+import gzip
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store import credentials, middleware
+from store.middleware import CompressionMiddleware
+from store.models import DeliveryLink, OfflineCredentialAssignment
+
+from .helpers import make_game, make_order
+
+BODY = ('<p>' + 'compressible page body ' * 40 + '</p>').encode()
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def run_middleware(self, response, accept=None):
+        headers = {'HTTP_ACCEPT_ENCODING': accept} if accept is not None else {}
+        request = RequestFactory().get('/', **headers)
+        return CompressionMiddleware(lambda r: response)(request)
+
+    def html(self, body=BODY, **headers):
+        response = HttpResponse(body, content_type='text/html; charset=utf-8')
+        for name, value in headers.items():
+            response.headers[name] = value
+        return response
+
+    def test_gzip_when_accepted(self):
+        response = self.run_middleware(self.html(), 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @skipUnless(middleware.brotli, 'brotli not installed')
+    def test_brotli_preferred_when_accepted(self):
+        response = self.run_middleware(self.html(ETag='"abc"'), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), BODY)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @skipUnless(middleware.brotli is None, 'brotli installed')
+    def test_br_only_client_gets_identity_without_brotli(self):
+        response = self.run_middleware(self.html(), 'br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, BODY)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_identity_when_nothing_accepted(self):
+        response = self.run_middleware(self.html(), '')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip_weakens_the_etag(self):
+        response = self.run_middleware(self.html(ETag='"abc"'), 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_small_bodies_pass_through(self):
+        response = self.run_middleware(self.html(b'<p>tiny</p>'), 'gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'<p>tiny</p>')
+
+    def test_streaming_responses_pass_through(self):
+        response = self.run_middleware(StreamingHttpResponse(iter([BODY]), content_type='text/html'), 'gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), BODY)
+
+    def test_binary_types_pass_through(self):
+        response = self.run_middleware(HttpResponse(BODY, content_type='image/png'), 'gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_already_encoded_bodies_pass_through(self):
+        response = self.run_middleware(self.html(**{'Content-Encoding': 'gzip'}), 'gzip, br')
+        self.assertEqual(response.content, BODY)
+
+    def test_secret_bearing_responses_pass_through(self):
+        response = self.html()
+        response.contains_secrets = True
+        for accept in ('gzip', 'gzip, br'):
+            with self.subTest(accept=accept):
+                self.assertFalse(self.run_middleware(response, accept).has_header('Content-Encoding'))
+
+
+class SecretPageCompressionTests(TestCase):
+    def setUp(self):
+        game = make_game()
+        order = make_order(game, status='completed')
+        content = ('buyer-login', 'hunter2-secret', '')
+        OfflineCredentialAssignment.objects.create(
+            order=order, game=game, snapshot_id=credentials.snapshot_ids([content])[content],
+        )
+        DeliveryLink.objects.create(order=order, token='secret-token', expires_at=timezone.now() + timedelta(days=1))
+
+    def test_delivery_page_is_never_compressed(self):
+        for accept in ('gzip', 'gzip, deflate, br'):
+            with self.subTest(accept=accept):
+                response = self.client.get(reverse('delivery_page', args=['secret-token']), HTTP_ACCEPT_ENCODING=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertContains(response, 'hunter2-secret')
+
+
+class PageEtagTests(TestCase):
+    fixtures = ['sample_games.json']
+
+    def test_compressed_page_revalidates_with_304(self):
+        first = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(first['ETag'].startswith('W/'))
+        again = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+
+    def test_etag_varies_with_htmx_and_cart(self):
+        full = self.client.get('/')['ETag']
+        partial = self.client.get('/', HTTP_HX_REQUEST='true')['ETag']
+        self.assertNotEqual(full, partial)
+        self.client.post('/cart/add/1/')
+        self.assertNotEqual(self.client.get('/')['ETag'], full)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from store import notifications
+from store.models import ChatMessage, PendingNotification
+
+from .helpers import make_game, make_order
+
+
+class FailingBackend(EmailBackend):
+    """locmem, except that messages whose subject names a listed order fail."""
+    failing = set()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(f'Order #{order_id}' in message.subject for order_id in self.failing):
+                raise OSError('SMTP down')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='store.tests.test_notifications.FailingBackend', SUPPORT_EMAIL='staff@example.com',
+    CHAT_NOTIFY_QUIET_SECONDS=120, CHAT_NOTIFY_MAX_DELAY=600,
+)
+class DigestTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now()
+        game = make_game()
+        self.order = make_order(game)
+        self.other = make_order(game, email='other@example.com')
+        FailingBackend.failing = set()
+
+    def say(self, order, text, at):
+        message = ChatMessage.objects.create(order=order, sender='customer', message=text)
+        notifications.buffer(message, now=self.start + timedelta(seconds=at))
+        return message
+
+    def flush(self, at):
+        return notifications.flush(now=self.start + timedelta(seconds=at))
+
+    def test_waits_for_the_thread_to_go_quiet_then_sends_one_digest(self):
+        self.say(self.order, 'hello', 0)
+        self.say(self.order, 'anyone there?', 60)
+        self.assertEqual(self.flush(150), 0)
+        self.assertEqual(self.flush(181), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('2 new chat messages', mail.outbox[0].subject)
+        self.assertIn('anyone there?', mail.outbox[0].body)
+        self.assertFalse(PendingNotification.objects.exists())
+        self.assertEqual(self.flush(1000), 0)
+
+    def test_a_busy_thread_is_sent_after_the_maximum_delay(self):
+        for at in range(0, 660, 60):
+            self.say(self.order, f'message at {at}', at)
+        self.assertEqual(self.flush(599), 0)
+        self.assertEqual(self.flush(601), 1)
+
+    def test_failed_send_keeps_the_digest_for_the_next_flush(self):
+        self.say(self.order, 'hello', 0)
+        FailingBackend.failing = {self.order.pk}
+        self.assertEqual(self.flush(200), 0)
+        self.assertEqual(PendingNotification.objects.get().count, 1)
+
+        FailingBackend.failing = set()
+        self.assertEqual(self.flush(260), 1)
+        self.assertIn('hello', mail.outbox[0].body)
+
+    def test_only_failed_threads_are_restored(self):
+        self.say(self.order, 'first thread', 0)
+        self.say(self.other, 'second thread', 0)
+        FailingBackend.failing = {self.other.pk}
+        self.assertEqual(self.flush(200), 1)
+        self.assertEqual(list(PendingNotification.objects.values_list('order_id', flat=True)), [self.other.pk])
+
+    def test_restored_digest_merges_with_a_newer_message(self):
+        first = self.say(self.order, 'hello', 0)
+        FailingBackend.failing = {self.order.pk}
+        original = notifications._send
+
+        def send_then_message(emails, connection=None):
+            # a customer writes again while the failing send is in flight
+            self.say(self.order, 'still waiting', 190)
+            return original(emails, connection)
+
+        with mock.patch.object(notifications, '_send', send_then_message):
+            self.flush(200)
+        pending = PendingNotification.objects.get()
+        self.assertEqual((pending.count, pending.first_message_id), (2, first.pk))
+        self.assertEqual(pending.first_at, self.start)
+
+        FailingBackend.failing = set()
+        self.flush(400)
+        self.assertIn('hello', mail.outbox[0].body)
+        self.assertIn('still waiting', mail.outbox[0].body)
@@ -0,0 +1,66 @@
+import random
+from datetime import timedelta
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.http import HttpResponse
+from django.utils import timezone
+
+from store import polling
+
+
+@override_settings(POLL_MIN_SECONDS=2, POLL_MAX_SECONDS=60, POLL_HIDDEN_SECONDS=60)
+class NextDelayTests(SimpleTestCase):
+    def delay(self, idle=None, **kwargs):
+        now = timezone.now()
+        last = now - timedelta(seconds=idle) if idle is not None else None
+        return polling.next_delay(last, now=now, **{'load': 1.0, 'jitter': 0, **kwargs})
+
+    def test_steps_back_off_with_idle_time(self):
+        self.assertEqual([self.delay(idle) for idle in (5, 60, 300, 3600)], [2, 5, 15, polling.IDLE_DELAY])
+        self.assertEqual(self.delay(None), polling.IDLE_DELAY)
+
+    def test_load_stretches_within_the_bounds(self):
+        self.assertEqual(self.delay(5, load=2.0), 4)
+        self.assertEqual(self.delay(None, load=4.0), 60)
+
+    def test_ceiling_caps_but_never_below_the_minimum(self):
+        self.assertEqual(self.delay(None, ceiling=15), 15)
+        self.assertEqual(self.delay(None, ceiling=0), 2)
+
+    def test_hidden_tabs_wait_at_least_the_hidden_delay(self):
+        self.assertEqual(self.delay(5, hidden=True), 60)
+        self.assertEqual(self.delay(5, hidden=True, ceiling=15), 60)
+
+    def test_jittered_delays_stay_within_bounds(self):
+        rng = random.Random(3)
+        now = timezone.now()
+        for idle in (None, 1, 40, 200, 5000):
+            for load in (1.0, 4.0):
+                last = now - timedelta(seconds=idle) if idle is not None else None
+                delay = polling.next_delay(last, now=now, load=load, rng=rng)
+                self.assertGreaterEqual(delay, 2)
+                self.assertLessEqual(delay, 60 * 1.1)
+
+    def test_advise_reads_the_hidden_header(self):
+        request = RequestFactory().get('/', HTTP_X_POLL_HIDDEN='1')
+        response = polling.advise(request, HttpResponse())
+        self.assertGreaterEqual(float(response[polling.DELAY_HEADER]), 60 * 0.9)
+
+
+@override_settings(POLL_MIN_SECONDS=2, POLL_MAX_SECONDS=60, POLL_HIDDEN_SECONDS=60)
+class SimulationTests(SimpleTestCase):
+    def reduction(self, results):
+        total = {name: sum(r['requests'] for r in groups.values()) for name, groups in results.items()}
+        return 1 - total['adaptive'] / total['fixed']
+
+    def test_mostly_idle_tabs_poll_far_less(self):
+        results = polling.simulate(clients=200, minutes=30, active=0.05, hidden=0.4)
+        self.assertGreater(self.reduction(results), 0.9)
+
+    def test_busy_tabs_still_poll_less_and_see_messages_quickly(self):
+        results = polling.simulate(clients=200, minutes=30, active=0.8, hidden=0.0)
+        self.assertGreater(self.reduction(results), 0.6)
+        lags = results['adaptive']['active/visible']['lags']
+        # inside a conversation the 5s step applies; only a reply after a long pause waits the idle delay
+        self.assertLessEqual(polling.percentile(lags, 0.95), 5 * 1.1)
+        self.assertLessEqual(max(lags), polling.IDLE_DELAY * 1.1)
@@ -0,0 +1,46 @@
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store import fulfillment
+from store.models import Order
+
+from .helpers import make_game, make_order
+
+
+@override_settings(CHECKOUT_MODE='queued', EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class QueuedCheckoutTests(TestCase):
+    def checkout(self, game, key):
+        self.client.post(reverse('cart_add', args=[game.pk]))
+        self.client.post(reverse('checkout'), {'email': 'buyer@example.com', 'idempotency_key': key})
+        return Order.objects.get(idempotency_key=key)
+
+    def test_checkout_queues_and_a_worker_delivers(self):
+        game = make_game(credentials=2)
+        first, second = self.checkout(game, 'a'), self.checkout(game, 'b')
+        self.assertEqual((first.status, second.status), ('queued', 'queued'))
+        self.assertEqual(fulfillment.queue_position(second), 1)
+        self.assertContains(self.client.get(reverse('order_progress', args=[second.pk])), '1 order ahead')
+
+        stats = fulfillment.process_queue()
+        self.assertEqual((stats.processed, stats.completed), (2, 2))
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'completed')
+        self.assertNotContains(self.client.get(reverse('order_progress', args=[second.pk])), 'hx-get')
+
+    def test_pending_orders_from_the_admin_are_not_queued(self):
+        game = make_game(credentials=1)
+        order = make_order(game, status='pending')
+        self.assertEqual(fulfillment.process_queue().processed, 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+class BenchCheckoutTests(TestCase):
+    def test_refuses_several_workers_on_sqlite(self):
+        with self.assertRaisesMessage(CommandError, 'SKIP LOCKED'):
+            call_command('bench_checkout', workers=2)
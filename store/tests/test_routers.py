@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from store import routers
+from store.middleware import ReplicaMiddleware
+from store.models import Game
+
+from .helpers import make_game
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """A second SQLite file stands in for the replica; it only sees rows copied by sync()."""
+
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.replica_name = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        # registered only for this class so other tests keep a primary-only setup; as a mirror
+        # the test case neither creates nor flushes it
+        connections.settings['replica1'] = {
+            **primary, 'NAME': cls.replica_name, 'TEST': {**primary['TEST'], 'MIRROR': DEFAULT_DB_ALIAS},
+        }
+        cls.databases = {DEFAULT_DB_ALIAS, 'replica1'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+        os.remove(cls.replica_name)
+
+    def setUp(self):
+        routers._health.clear()
+        make_game(title='Synced')
+        self.sync()
+        make_game(title='Fresh')
+
+    def sync(self):
+        connections['replica1'].close()
+        source = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        target = sqlite3.connect(self.replica_name)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+    def titles(self):
+        return set(Game.objects.values_list('title', flat=True))
+
+    def test_reads_stay_on_primary_by_default(self):
+        self.assertEqual(self.titles(), {'Synced', 'Fresh'})
+
+    def test_allowed_reads_go_to_replica(self):
+        token = routers.pin_primary(False)
+        try:
+            self.assertEqual(router.db_for_read(Game), 'replica1')
+            self.assertEqual(self.titles(), {'Synced'})
+            # sessions, auth and admin always read the primary
+            self.assertEqual(router.db_for_read(get_user_model()), DEFAULT_DB_ALIAS)
+        finally:
+            routers.unpin(token)
+        self.assertEqual(router.db_for_write(Game), DEFAULT_DB_ALIAS)
+
+    def test_reads_inside_a_transaction_use_primary(self):
+        token = routers.pin_primary(False)
+        try:
+            with transaction.atomic():
+                make_game(title='Uncommitted')
+                self.assertIn('Uncommitted', self.titles())
+        finally:
+            routers.unpin(token)
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        token = routers.pin_primary(False)
+        try:
+            with mock.patch.object(routers, '_probe', side_effect=OperationalError('down')) as probe:
+                self.assertEqual(self.titles(), {'Synced', 'Fresh'})
+                self.assertEqual(router.db_for_read(Game), DEFAULT_DB_ALIAS)
+            # the failed probe is cached for REPLICA_HEALTH_INTERVAL
+            self.assertEqual(probe.call_count, 1)
+            self.assertEqual(router.db_for_read(Game), DEFAULT_DB_ALIAS)
+        finally:
+            routers.unpin(token)
+
+    def test_replica_without_schema_is_unhealthy(self):
+        connections['replica1'].close()
+        open(self.replica_name, 'wb').close()
+        self.assertFalse(routers.is_healthy('replica1'))
+
+    def test_catalog_page_reads_replica(self):
+        response = self.client.get('/')
+        self.assertContains(response, 'Synced')
+        self.assertNotContains(response, 'Fresh')
+
+    def test_sticky_cookie_pins_reads_to_primary(self):
+        self.client.cookies['db_primary'] = '1'
+        self.assertContains(self.client.get('/'), 'Fresh')
+
+    def run_middleware(self, method, path='/', cookies=None, status=200):
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Game))
+            return HttpResponse(status=status)
+
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        response = ReplicaMiddleware(view)(request)
+        return seen[0], response
+
+    def test_middleware_routing(self):
+        self.assertEqual(self.run_middleware('get')[0], 'replica1')
+        self.assertEqual(self.run_middleware('post')[0], DEFAULT_DB_ALIAS)
+        self.assertEqual(self.run_middleware('get', '/admin/store/game/')[0], DEFAULT_DB_ALIAS)
+        self.assertEqual(self.run_middleware('get', cookies={'db_primary': '1'})[0], DEFAULT_DB_ALIAS)
+        # the pin does not leak out of the request
+        self.assertEqual(router.db_for_read(Game), DEFAULT_DB_ALIAS)
+
+    @override_settings(REPLICA_STICKY_SECONDS=5, REPLICA_MAX_LAG=30)
+    def test_sticky_cookie_outlasts_replica_lag(self):
+        _, response = self.run_middleware('post')
+        self.assertEqual(response.cookies['db_primary']['max-age'], 30)
+        _, response = self.run_middleware('post', status=400)
+        self.assertNotIn('db_primary', response.cookies)
+        _, response = self.run_middleware('get')
+        self.assertNotIn('db_primary', response.cookies)
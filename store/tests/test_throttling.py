@@ -0,0 +1,98 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store import throttling
+from store.models import DeliveryLink
+
+from .helpers import make_game, make_order
+
+NOW = 1_000_000.0
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling._memory.buckets.clear()
+
+    def test_bucket_refills_over_time(self):
+        self.assertEqual(throttling.take('scope', 'a', '2/m', now=NOW), 0)
+        self.assertEqual(throttling.take('scope', 'a', '2/m', now=NOW), 0)
+        self.assertEqual(throttling.take('scope', 'a', '2/m', now=NOW), 30)
+        self.assertEqual(throttling.take('scope', 'a', '2/m', now=NOW + 30), 0)
+        # other identities have their own bucket
+        self.assertEqual(throttling.take('scope', 'b', '2/m', now=NOW), 0)
+
+    def test_cache_failure_falls_back_to_memory(self):
+        with mock.patch.object(throttling.CacheStore, 'take', side_effect=ConnectionError('cache down')):
+            self.assertEqual(throttling.take('scope', 'a', '1/m', now=NOW), 0)
+            self.assertEqual(throttling.take('scope', 'a', '1/m', now=NOW), 60)
+        self.assertIn('throttle:scope:a', throttling._memory.buckets)
+
+    @override_settings(THROTTLE_STORE='memory')
+    def test_memory_store_setting(self):
+        throttling.take('scope', 'a', '1/m', now=NOW)
+        self.assertIn('throttle:scope:a', throttling._memory.buckets)
+        self.assertIsNone(cache.get('throttle:scope:a'))
+
+    def test_memory_store_is_bounded(self):
+        store = throttling.MemoryStore(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            store.take(key, 1, 1, NOW)
+        self.assertEqual(list(store.buckets), ['b', 'c'])
+
+    @override_settings(THROTTLE_RATES={'scope': '1/h'})
+    def test_rate_override(self):
+        self.assertEqual(throttling.take('scope', 'a', '100/m', now=NOW), 0)
+        self.assertEqual(throttling.take('scope', 'a', '100/m', now=NOW), 3600)
+
+
+# a frozen clock for the limiter only, so Retry-After values are exact
+@mock.patch.object(throttling, 'time', mock.Mock(time=lambda: NOW))
+class ThrottledViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling._memory.buckets.clear()
+
+    def request_purchases(self, email):
+        return self.client.post(reverse('purchases_request'), {'email': email})
+
+    def test_429_with_retry_after_per_email(self):
+        for _ in range(3):
+            self.assertNotEqual(self.request_purchases('a@example.com').status_code, 429)
+        response = self.request_purchases('A@example.com ')
+        self.assertEqual(response.status_code, 429)
+        # 3/h refills one token every 1200s
+        self.assertEqual(response['Retry-After'], '1200')
+        self.assertNotEqual(self.request_purchases('b@example.com').status_code, 429)
+
+    @override_settings(THROTTLE_RATES={'purchases_email': '1/h'})
+    def test_rates_setting_retunes_a_view(self):
+        self.assertNotEqual(self.request_purchases('a@example.com').status_code, 429)
+        response = self.request_purchases('a@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3600')
+
+    def test_chat_limited_per_delivery_token(self):
+        expires = timezone.now() + timedelta(days=1)
+        game = make_game()
+        for token in ('first', 'second'):
+            DeliveryLink.objects.create(order=make_order(game), token=token, expires_at=expires)
+        first = reverse('delivery_chat', args=['first'])
+        for _ in range(12):
+            self.assertEqual(self.client.post(first, {'message': ''}).status_code, 200)
+        response = self.client.post(first, {'message': ''})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(self.client.post(reverse('delivery_chat', args=['second']), {'message': ''}).status_code, 200)
+        # polling is not charged
+        self.assertEqual(self.client.get(first).status_code, 200)
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(5):
+            self.assertNotEqual(self.request_purchases('a@example.com').status_code, 429)
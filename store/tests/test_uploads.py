@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile, StopUpload
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store import uploads
+from store.models import ChatMessage, DeliveryLink
+
+from .helpers import make_game, make_order
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 200
+
+
+class ChatImageUploadHandlerTests(TestCase):
+    def handler(self, content_length=1000):
+        request = RequestFactory().post('/')
+        handler = uploads.ChatImageUploadHandler(request)
+        handler.handle_raw_input(None, request.META, content_length, b'boundary')
+        return handler, request
+
+    def test_sniff(self):
+        self.assertEqual(uploads.sniff(PNG[:16]), 'image/png')
+        self.assertEqual(uploads.sniff(b'RIFF\0\0\0\0WEBPVP8 '), 'image/webp')
+        self.assertIsNone(uploads.sniff(b'%PDF-1.7\n'))
+
+    def test_non_image_is_skipped_at_first_chunk(self):
+        handler, request = self.handler()
+        handler.new_file('image', 'doc.png', 'image/png', 9)
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'%PDF-1.7\n', 0)
+        self.assertIn('image', request.upload_errors)
+
+    @override_settings(CHAT_UPLOAD_MAX_BYTES=1024)
+    def test_stream_past_the_cap_stops_the_upload(self):
+        handler, request = self.handler(content_length=4096)
+        handler.new_file('image', 'a.png', 'image/png', None)
+        handler.receive_data_chunk(PNG + b'\0' * 500, 0)
+        with self.assertRaises(StopUpload) as ctx:
+            handler.receive_data_chunk(b'\0' * 500, len(PNG) + 500)
+        self.assertTrue(ctx.exception.connection_reset)
+        self.assertEqual(request.upload_errors['image'], 'File is too large.')
+
+    @override_settings(CHAT_UPLOAD_MAX_BYTES=1024)
+    def test_declared_length_rejects_before_any_data(self):
+        handler, request = self.handler(content_length=1024 + 64 * 1024 + 1)
+        with self.assertRaises(StopUpload):
+            handler.new_file('image', 'a.png', 'image/png', None)
+        self.assertEqual(request.upload_errors['image'], 'File is too large.')
+
+    def test_accepted_file_gets_a_digest(self):
+        handler, request = self.handler()
+        handler.new_file('image', 'a.png', 'image/png', len(PNG))
+        self.assertEqual(handler.receive_data_chunk(PNG, 0), PNG)
+        self.assertIsNone(handler.file_complete(len(PNG)))
+        self.assertEqual(len(request.upload_digests['image']), 64)
+
+
+class ChatUploadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media, CHAT_UPLOAD_MAX_BYTES=1024)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.order = make_order(make_game())
+        DeliveryLink.objects.create(order=self.order, token='chat-token', expires_at=timezone.now() + timedelta(days=1))
+        self.url = reverse('delivery_chat', args=['chat-token'])
+
+    def post(self, body, name='a.png', message='hello', client=None):
+        upload = SimpleUploadedFile(name, body, content_type='image/png')
+        return (client or self.client).post(self.url, {'message': message, 'image': upload})
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media) for name in names]
+
+    def test_non_image_is_dropped_but_text_kept(self):
+        response = self.post(b'%PDF-1.7\n' + b'x' * 100)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('image', response.wsgi_request.upload_errors)
+        message = ChatMessage.objects.get(order=self.order)
+        self.assertEqual(message.message, 'hello')
+        self.assertFalse(message.image)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_oversized_stream_is_not_stored(self):
+        response = self.post(PNG + b'\0' * 2000)
+        self.assertEqual(response.wsgi_request.upload_errors['image'], 'File is too large.')
+        self.assertFalse(ChatMessage.objects.get(order=self.order).image)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_oversized_declared_body_is_refused_unread(self):
+        response = self.post(PNG + b'\0' * (70 * 1024))
+        self.assertEqual(response.wsgi_request.upload_errors['image'], 'File is too large.')
+        self.assertEqual(ChatMessage.objects.get(order=self.order).message, 'hello')
+        self.assertEqual(self.stored_files(), [])
+
+    def test_identical_uploads_share_one_file(self):
+        self.post(PNG, name='first.png')
+        self.post(PNG, name='second.png')
+        first, second = ChatMessage.objects.filter(order=self.order).order_by('pk')
+        self.assertTrue(first.image)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_sha256, second.image_sha256)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_delivery_chat_enforces_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(self.post(PNG, client=client).status_code, 403)
+        self.assertFalse(ChatMessage.objects.exists())
+        client.cookies['csrftoken'] = 'a' * 32
+        response = client.post(self.url, {'message': 'hello', 'csrfmiddlewaretoken': 'a' * 32})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ChatMessage.objects.exists())
+
+    def test_staff_reply_enforces_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(get_user_model().objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        url = reverse('admin:store_orderchat_reply', args=[self.order.pk])
+        self.assertEqual(client.post(url, {'message': 'hi'}).status_code, 403)
+        self.assertFalse(ChatMessage.objects.exists())
+        client.cookies['csrftoken'] = 'a' * 32
+        response = client.post(url, {'message': 'hi', 'csrfmiddlewaretoken': 'a' * 32})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ChatMessage.objects.get().sender, 'admin')
@@ -0,0 +1,128 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import metrics
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/m' -> (capacity 5, refill 5/60 tokens per second)."""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period[:1]]
+
+
+def _refill(state, capacity, refill, now, cost=1):
+    """One token-bucket step. Returns (new state, seconds to wait or 0 when allowed)."""
+    tokens, stamp = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - stamp) * refill)
+    if tokens >= cost:
+        return (tokens - cost, now), 0
+    return (tokens, now), (cost - tokens) / refill
+
+
+class MemoryStore:
+    """Per-process buckets; bounded so a scan of random IPs can't grow it without limit."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill, now):
+        with self.lock:
+            state, wait = _refill(self.buckets.pop(key, None), capacity, refill, now)
+            self.buckets[key] = state
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheStore:
+    """Buckets in the Django cache so all workers share them (Redis in production).
+
+    get + set is not atomic; under a burst of truly concurrent requests for one key a few
+    extra may pass, which is acceptable for abuse protection.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def take(self, key, capacity, refill, now):
+        cache = caches[self.alias]
+        state, wait = _refill(cache.get(key), capacity, refill, now)
+        # an idle bucket is full again after capacity / refill seconds; let it expire then
+        cache.set(key, state, timeout=math.ceil(capacity / refill) + 1)
+        return wait
+
+
+_memory = MemoryStore()
+
+
+def store():
+    if getattr(settings, 'THROTTLE_STORE', 'cache') == 'memory':
+        return _memory
+    return CacheStore(getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default'))
+
+
+def take(scope, ident, rate, now=None):
+    """Spend one token from scope/ident's bucket. Returns seconds to wait, 0 when allowed."""
+    capacity, refill = parse_rate(getattr(settings, 'THROTTLE_RATES', {}).get(scope, rate))
+    key = f'throttle:{scope}:{ident}'
+    now = time.time() if now is None else now
+    try:
+        return store().take(key, capacity, refill, now)
+    except Exception:
+        # cache unreachable: keep limiting per process rather than failing open or closed
+        return _memory.take(key, capacity, refill, now)
+
+
+def client_ip(request, kwargs):
+    if getattr(settings, 'THROTTLE_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def posted_email(request, kwargs):
+    return (request.POST.get('email') or '').strip().lower() or None
+
+
+def url_token(request, kwargs):
+    return kwargs.get('token')
+
+
+def throttle(name, *buckets, methods=('POST',)):
+    """Rate-limit a view with token buckets given as (scope, key function, default rate).
+
+    Every bucket is charged; if any is empty the view is skipped and a 429 with Retry-After
+    is returned. Scopes can be retuned through settings.THROTTLE_RATES.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and getattr(settings, 'THROTTLE_ENABLED', True):
+                wait = 0
+                for scope, key, rate in buckets:
+                    ident = key(request, kwargs)
+                    if ident:
+                        wait = max(wait, take(scope, ident, rate))
+                if wait:
+                    metrics.THROTTLED.inc(view=name)
+                    response = HttpResponse('Too many requests. Please try again shortly.', status=429,
+                                            content_type='text/plain; charset=utf-8')
+                    response['Retry-After'] = str(math.ceil(wait))
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
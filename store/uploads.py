@@ -0,0 +1,98 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+
+from .models import ChatMessage
+
+
+# leading bytes of the formats ChatMessage.image accepts
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def max_bytes():
+    return getattr(settings, 'CHAT_UPLOAD_MAX_BYTES', 5 * 1024 * 1024)
+
+
+def sniff(head):
+    """Image content type from the first bytes of a file, or None."""
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class ChatImageUploadHandler(FileUploadHandler):
+    """Validates chat attachments while they stream in, ahead of the default storage handlers.
+
+    Non-images are dropped at the first chunk and oversized files stop the upload, so
+    neither is buffered to memory or disk. Accepted files get a SHA-256 computed on the
+    fly, exposed as request.upload_digests[field_name]; rejections land in request.upload_errors.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limit = max_bytes()
+        self.declared_length = 0
+        request.upload_digests = {}
+        request.upload_errors = {}
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.declared_length = content_length
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        # the whole body is bigger than a file may be, plus room for the other form fields
+        if self.declared_length > self.limit + 64 * 1024:
+            self._reject('File is too large.', stop=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and sniff(raw_data[:16]) is None:
+            self._reject('Only JPEG, PNG, GIF or WebP images are allowed.')
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            self._reject('File is too large.', stop=True)
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+        # storage is left to the next handler in the chain
+        return None
+
+    def _reject(self, reason, stop=False):
+        self.request.upload_errors[self.field_name] = reason
+        if stop:
+            # don't read the rest of the body; fields already parsed (the message text) are kept
+            raise StopUpload(connection_reset=True)
+        raise SkipFile()
+
+
+def install(request):
+    """Put the chat handler in front of the defaults; call before request.POST/FILES is touched."""
+    request.upload_handlers.insert(0, ChatImageUploadHandler(request))
+
+
+def attach_image(message, upload, request, field_name='image'):
+    """Set message.image, reusing the stored file of an identical earlier upload."""
+    digest = getattr(request, 'upload_digests', {}).get(field_name, '')
+    message.image_sha256 = digest
+    existing = None
+    if digest:
+        existing = (
+            ChatMessage.objects.filter(image_sha256=digest).exclude(image='')
+            .values_list('image', flat=True).first()
+        )
+    if existing:
+        message.image.name = existing
+    else:
+        message.image = upload
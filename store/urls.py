@@ -6,6 +6,7 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('game/<int:pk>/', views.game_detail, name='game_detail'),
     path('game/<int:pk>/<slug:slug>/', views.game_detail, name='game_detail_slug'),
+    path('img/<int:width>/<str:token>/', views.image_proxy, name='image_proxy'),
     path('delivery/<str:token>/', views.delivery_page, name='delivery_page'),
     path('delivery/<str:token>/chat/', views.delivery_chat, name='delivery_chat'),
     
@@ -18,4 +19,6 @@ urlpatterns = [
     path('cart/remove/<int:game_id>/', views.cart_remove, name='cart_remove'),
     path('checkout/', views.checkout, name='checkout'),
     path('order/success/<int:order_id>/', views.order_success, name='order_success'),
+    path('order/success/<int:order_id>/progress/', views.order_progress, name='order_progress'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
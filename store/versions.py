@@ -0,0 +1,29 @@
+from django.db.models import Count, Max
+
+from .models import ChatMessage, Game, JobCursor
+
+
+def catalog_state():
+    """(version, last_modified) for the catalog; changes on any game add/edit/delete or pool empty/restock."""
+    agg = Game.objects.aggregate(last=Max('updated_at'), n=Count('id'))
+    last = agg['last'].timestamp() if agg['last'] else 0
+    return f"{agg['n']}-{last}", agg['last']
+
+
+def catalog_version():
+    return catalog_state()[0]
+
+
+def chat_state(order_id):
+    """(key, last_modified) watermark of an order's chat thread; key is None when it has no messages."""
+    agg = ChatMessage.objects.filter(order_id=order_id).aggregate(
+        last=Max('id'), n=Count('id'), last_at=Max('created_at'),
+    )
+    if not agg['n']:
+        return None, None
+    return f"{order_id}-{agg['last']}-{agg['n']}", agg['last_at']
+
+
+def job_position(name):
+    """Cursor of an incremental job; moves whenever the job publishes new derived rows."""
+    return JobCursor.objects.filter(name=name).values_list('position', flat=True).first() or 0
@@ -1,39 +1,114 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse
 from django.urls import reverse
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
-
-from .models import Game, Order, OrderItem, GameCredential, OfflineCredentialAssignment, DeliveryLink, EmailAccessLink, ChatMessage
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_headers
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+import hashlib
+import secrets
+
+from .models import Customer, Game, Order, OrderItem, DeliveryLink, EmailAccessLink, ChatMessage
 from .forms import CheckoutForm
+from . import customers, delivery, events, fulfillment, images, mail, metrics, notifications, polling, recommendations, stock, throttling, uploads, versions
+from .middleware import contains_secrets
+from .throttling import throttle
 
 
 def _is_htmx(request):
     return request.headers.get('HX-Request') == 'true'
 
 
+# CONDITIONAL GET
+# Watermarks are memoized on the request so the ETag check and the view share one query.
+def _catalog_version(request):
+    if not hasattr(request, '_catalog_version'):
+        request._catalog_version = versions.catalog_version()
+    return request._catalog_version
+
+
+def _page_etag(request, *parts):
+    # besides the data, a page varies with the cart badge, the CSRF secret behind its form tokens and HTMX vs full page
+    cart = sorted(request.session.get('cart', {}).items())
+    raw = '|'.join(str(p) for p in parts) + f"|{cart}|{request.META.get('CSRF_COOKIE', '')}|{_is_htmx(request)}"
+    return hashlib.md5(raw.encode('utf-8'), usedforsecurity=False).hexdigest()
+
+
+def _home_etag(request):
+    return _page_etag(request, 'home', _catalog_version(request), request.GET.urlencode())
+
+
+def _detail_etag(request, pk, slug=None):
+    return _page_etag(request, 'detail', pk, _catalog_version(request), versions.job_position(recommendations.CURSOR))
+
+
+def _cart_etag(request):
+    return _page_etag(request, 'cart', _catalog_version(request))
+
+
+def chat_partial(request, order_id, viewer, context=None):
+    """Render an order's chat thread; a poll that saw the same watermark gets a 304."""
+    key, last_at = versions.chat_state(order_id)
+    etag = quote_etag(hashlib.md5(f'{key}|{viewer}'.encode('utf-8'), usedforsecurity=False).hexdigest())
+    last_modified = int(last_at.timestamp()) if last_at else None
+    if request.method in ('GET', 'HEAD'):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return polling.advise(request, response, last_at)
+    response = render(request, 'store/partials/chat_messages.html', {
+        **(context or {}),
+        'messages': ChatMessage.objects.filter(order_id=order_id),
+        'chat_key': key,
+        'viewer': viewer,
+    })
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    # always revalidate, so polls cost a 304 instead of a stale heuristic hit
+    patch_cache_control(response, private=True, no_cache=True)
+    return polling.advise(request, response, last_at)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_home_etag)
+@vary_on_headers('HX-Request')
 def home(request):
     games = Game.objects.all().order_by('-id')
     category = request.GET.get('category')
     q = request.GET.get('q')
     sort = request.GET.get('sort')
+    band = request.GET.get('band')
+    if band not in dict(Game.PRICE_BAND_CHOICES):
+        band = ''
 
     if category:
         games = games.filter(category=category)
+    if band:
+        games = games.filter(price_band=band)
     if q:
         games = games.filter(title__icontains=q)
     if sort == 'price-asc':
         games = games.order_by('price')
     elif sort == 'price-desc':
         games = games.order_by('-price')
+    elif sort == 'discount':
+        games = games.order_by('-discount_percent', '-id')
 
     context = {
         'games': games,
         'category': category or '',
         'q': q or '',
         'sort': sort or '',
+        'band': band,
+        'price_bands': [('', 'Any price')] + Game.PRICE_BAND_CHOICES,
+        'catalog_version': _catalog_version(request),
         'categories': [
             ('', 'All'),
             ('offline-account', 'Offline Account'),
@@ -47,6 +122,35 @@ def home(request):
     return render(request, 'store/home.html', context)
 
 
+def image_proxy(request, width, token):
+    source = images.unsign(token)
+    if not source or width not in images.widths():
+        raise Http404
+    if not images.enabled():
+        return redirect(source)
+    path = images.variant_path(images.url_hash(source), width)
+    if not path.exists():
+        # a source that just failed is not refetched (and waited on) by every request
+        if images.retry_pending(source):
+            return redirect(source)
+        try:
+            images.ensure_variants(source)
+        except Exception:
+            # unreachable host or undecodable image: let the browser try the original
+            return redirect(source)
+    # the URL is keyed by source, not content, and refresh_images re-renders in place:
+    # cache for a bounded time, then revalidate against the variant's mtime
+    stat = path.stat()
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type='image/webp')
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'IMAGE_PROXY_MAX_AGE', 24 * 3600))
+    return response
+
+
 # CART UTILITIES
 def _get_cart(session):
     return session.setdefault('cart', {})
@@ -67,22 +171,33 @@ def _cart_totals(cart):
     return item_list, total
 
 
+def _reserve_cart(request, items):
+    # reservations are keyed by session, so make sure one exists
+    if not request.session.session_key:
+        request.session.save()
+    stock.reserve_cart(request.session.session_key, items)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_cart_etag)
 def cart_detail(request):
     cart = request.session.get('cart', {})
     items, total = _cart_totals(cart)
     return render(request, 'store/cart.html', {'items': items, 'total': total})
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_detail_etag)
 def game_detail(request, pk, slug=None):
     game = get_object_or_404(Game, pk=pk)
-    # related games by category
-    related = Game.objects.filter(category=game.category).exclude(pk=game.pk)[:4]
+    related = recommendations.related_games(game)
     return render(request, 'store/detail.html', {
         'game': game,
         'related': related,
     })
 
 
+@throttle('cart_add', ('cart_ip', throttling.client_ip, '60/m'))
 def cart_add(request, game_id):
     if request.method != 'POST':
         return HttpResponse(status=405)
@@ -90,11 +205,13 @@ def cart_add(request, game_id):
     cart[str(game_id)] = int(cart.get(str(game_id), 0)) + int(request.POST.get('quantity', 1))
     request.session.modified = True
     items, total = _cart_totals(cart)
+    _reserve_cart(request, items)
     if _is_htmx(request):
         return render(request, 'store/partials/cart_count.html', {'items': items}, status=200)
     return redirect('cart')
 
 
+@throttle('cart_update', ('cart_ip', throttling.client_ip, '60/m'))
 def cart_update(request, game_id):
     if request.method != 'POST':
         return HttpResponse(status=405)
@@ -107,8 +224,9 @@ def cart_update(request, game_id):
         qty = 1
     cart[str(game_id)] = qty
     request.session.modified = True
+    items, total = _cart_totals(cart)
+    _reserve_cart(request, items)
     if _is_htmx(request):
-        items, total = _cart_totals(cart)
         return render(request, 'store/partials/cart_table.html', {'items': items, 'total': total, 'is_htmx': True})
     return redirect('cart')
 
@@ -117,14 +235,28 @@ def cart_remove(request, game_id):
     cart = _get_cart(request.session)
     cart.pop(str(game_id), None)
     request.session.modified = True
+    items, total = _cart_totals(cart)
+    _reserve_cart(request, items)
     if _is_htmx(request):
-        items, total = _cart_totals(cart)
         return render(request, 'store/partials/cart_table.html', {'items': items, 'total': total, 'is_htmx': True})
     return redirect('cart')
 
 
+def _replayed_order(key):
+    if not key:
+        return None
+    return Order.objects.filter(idempotency_key=key).only('id').first()
+
+
+@metrics.timed(metrics.CHECKOUT_SECONDS, methods=('POST',))
 @transaction.atomic
 def checkout(request):
+    if request.method == 'POST':
+        # a double-click or retried POST returns the order the first submit created
+        replayed = _replayed_order(request.POST.get('idempotency_key'))
+        if replayed:
+            return redirect('order_success', order_id=replayed.id)
+
     cart = request.session.get('cart', {})
     items, total = _cart_totals(cart)
     if not items:
@@ -133,49 +265,62 @@ def checkout(request):
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            order = Order.objects.create(
-                email=form.cleaned_data['email'],
-                name=form.cleaned_data.get('name', ''),
-            )
+            key = form.cleaned_data.get('idempotency_key') or None
+            queued = getattr(settings, 'CHECKOUT_MODE', 'sync') == 'queued'
+            try:
+                with transaction.atomic():
+                    # the aggregate rolls back with the order if the idempotency key is taken
+                    customer = customers.record_order(form.cleaned_data['email'], total)
+                    order = Order.objects.create(
+                        email=form.cleaned_data['email'],
+                        name=form.cleaned_data.get('name', ''),
+                        customer=customer,
+                        idempotency_key=key,
+                        status='queued' if queued else 'pending',
+                    )
+            except IntegrityError:
+                # a concurrent duplicate won the unique key; hand back its order
+                replayed = _replayed_order(key)
+                if replayed is None:
+                    raise
+                return redirect('order_success', order_id=replayed.id)
             # create order items
-            for it in items:
-                OrderItem.objects.create(
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
                     game=it['game'],
                     quantity=it['qty'],
                     unit_price=it['game'].price,
                 )
+                for it in items
+            ])
+            events.record(
+                'order.created', order.id,
+                items=[{'game': it['game'].pk, 'quantity': it['qty'], 'unit_price': str(it['game'].price)} for it in items],
+                total=str(total),
+            )
+
+            if queued:
+                # process_checkout_queue allocates, links and emails it
+                _clear_cart(request)
+                return redirect('order_success', order_id=order.id)
 
             # allocate account credentials
             partial = False
             for it in order.items.select_related('game'):
-                needed = it.quantity
-                if it.game.category in ('offline-account', 'online-account'):
-                    creds = list(GameCredential.objects.filter(game=it.game).order_by('id'))
-                    if not creds:
+                if it.game.category in Game.ACCOUNT_CATEGORIES:
+                    # gate on the pool, not stock_available, which is only kept for display
+                    assigned = fulfillment.allocate(it.game, [(order.id, it.quantity)])
+                    if not assigned:
                         partial = True
-                    if creds:
-                        count = len(creds)
-                        start = it.game.rotation_index % count
-                        for i in range(needed):
-                            idx = (start + i) % count
-                            c = creds[idx]
-                            OfflineCredentialAssignment.objects.create(
-                                order=order,
-                                game=it.game,
-                                username=c.username,
-                                password=c.password,
-                                notes=c.notes,
-                            )
-                        # advance rotation pointer
-                        it.game.rotation_index = (start + needed) % count
-                        it.game.save(update_fields=['rotation_index'])
 
             order.status = 'partial' if partial else 'completed'
+            events.record('order.status', order.id, old='pending', new=order.status)
+            # delivered credentials don't change after checkout, so group them once
+            order.delivery_snapshot = delivery.build_payload(order)
             order.save()
 
             # create order access link (24h)
-            import secrets
             order_token = secrets.token_urlsafe(32)
             order_link = DeliveryLink.objects.create(
                 order=order,
@@ -185,38 +330,11 @@ def checkout(request):
 
             # prepare email (send account credentials inline)
             subject = f"Your Cheappcgames Order #{order.id}"
-            body = (
-                f"Hello {order.name or 'there'}\n\n"
-                f"Thank you for your purchase.\n"
-                f"Order #: {order.id}\n"
-            )
-            # include account credentials inline (no numbering)
-            if order.offline_assignments.exists():
-                body += "\n\nAccount Credentials:\n"
-                # group by game
-                assignments = order.offline_assignments.select_related('game').order_by('game__title', 'created_at')
-                grouped = {}
-                for a in assignments:
-                    grouped.setdefault(a.game, []).append(a)
-                for game, creds in grouped.items():
-                    body += f"\n{game.title}:\n"
-                    if getattr(game, 'instructions', ''):
-                        body += f"Instructions: {game.instructions}\n"
-                    for c in creds:
-                        body += f"Username: {c.username}\nPassword: {c.password}\n"
-                        if c.notes:
-                            body += f"Notes: {c.notes}\n"
-                        body += "\n"
-            # order page link
             url = request.build_absolute_uri(reverse('delivery_page', args=[order_link.token]))
-            body += f"\nView your order page (valid 24 hours):\n{url}"
-
-            body += "\n\nIf some items are missing, we'll deliver them shortly."
-            send_mail(subject, body, None, [order.email], fail_silently=True)
+            body = delivery.email_body(order, delivery.resolve(order.delivery_snapshot), url)
+            mail.send_mail(subject, body, None, [order.email], kind='order', fail_silently=True)
 
-            # clear cart
-            request.session['cart'] = {}
-            request.session.modified = True
+            _clear_cart(request)
             return redirect('order_success', order_id=order.id)
     else:
         form = CheckoutForm()
@@ -224,9 +342,33 @@ def checkout(request):
     return render(request, 'store/checkout.html', {'form': form, 'items': items, 'total': total})
 
 
+def _clear_cart(request):
+    # clear cart and release its reservations
+    request.session['cart'] = {}
+    request.session.modified = True
+    stock.release_cart(request.session.session_key)
+
+
+def _order_progress_context(order):
+    ahead = fulfillment.queue_position(order) if order.status == 'queued' else 0
+    return {
+        'order': order,
+        'ahead': ahead,
+        # a long queue won't move much in 2s; about one second per 25 orders ahead, 2-15s
+        'poll_after': min(max(polling.min_delay(), ahead // 25), 15),
+    }
+
+
 def order_success(request, order_id):
     order = get_object_or_404(Order, id=order_id)
-    return render(request, 'store/order_success.html', {'order': order})
+    return render(request, 'store/order_success.html', _order_progress_context(order))
+
+
+@cache_control(no_store=True)
+def order_progress(request, order_id):
+    """Polled by the success page while a queued order waits for a worker."""
+    order = get_object_or_404(Order, id=order_id)
+    return render(request, 'store/partials/order_progress.html', _order_progress_context(order))
 
 
 def buy_now(request, game_id):
@@ -241,111 +383,124 @@ def buy_now(request, game_id):
     # Replace cart with only this item for a clean checkout
     request.session['cart'] = {str(game_id): qty}
     request.session.modified = True
+    items, total = _cart_totals(request.session['cart'])
+    _reserve_cart(request, items)
     return redirect('checkout')
 
 
+@contains_secrets
 def delivery_page(request, token):
-    link = get_object_or_404(DeliveryLink, token=token)
+    link = get_object_or_404(DeliveryLink.objects.select_related('order'), token=token)
     if not link.is_valid():
         return render(request, 'store/delivery_expired.html', status=410)
-    # group assignments by game
     order = link.order
-    assignments = order.offline_assignments.select_related('game').order_by('game__title', 'created_at')
-    by_game = {}
-    for a in assignments:
-        by_game.setdefault(a.game, []).append(a)
-    items = list(order.items.select_related('game'))
     return render(request, 'store/delivery.html', {
         'order': order,
-        'by_game': by_game,
+        'delivery': delivery.get_payload(order),
         'link': link,
-        'items': items,
     })
 
 
+@csrf_exempt
+# ahead of the upload handlers, so a throttled post is refused before its body is read
+@throttle('delivery_chat', ('chat_ip', throttling.client_ip, '30/m'), ('chat_token', throttling.url_token, '12/m'))
 def delivery_chat(request, token):
-    link = get_object_or_404(DeliveryLink, token=token)
+    # upload handlers must be in place before CSRF checking reads request.POST
+    uploads.install(request)
+    return _delivery_chat(request, token)
+
+
+@csrf_protect
+@contains_secrets
+def _delivery_chat(request, token):
+    link = get_object_or_404(DeliveryLink.objects.select_related('order'), token=token)
     if not link.is_valid():
         return render(request, 'store/delivery_expired.html', status=410)
     order = link.order
+    if request.method == 'GET':
+        metrics.CHAT_POLLS.inc(endpoint='delivery_chat')
     if request.method == 'POST':
         text = (request.POST.get('message') or '').strip()
         image = request.FILES.get('image')
         # basic validation for image
         if image and not getattr(image, 'content_type', '').startswith('image/'):
             image = None
-        if image and getattr(image, 'size', 0) > 5 * 1024 * 1024:
+        if image and getattr(image, 'size', 0) > uploads.max_bytes():
             image = None
         if text or image:
             # customer message arrives via delivery page
-            ChatMessage.objects.create(order=order, sender='customer', message=text, image=image, is_read=False)
-            # Notify support/admin via email
-            try:
-                support_email = getattr(settings, 'SUPPORT_EMAIL', None)
-                recipients = []
-                if support_email:
-                    recipients = [support_email]
-                if not recipients and getattr(settings, 'DEFAULT_FROM_EMAIL', None):
-                    recipients = [settings.DEFAULT_FROM_EMAIL]
-                if recipients:
-                    # Link to admin chat thread (OrderChat proxy change view)
-                    try:
-                        admin_url = request.build_absolute_uri(reverse('admin:store_orderchat_change', args=[order.id]))
-                    except Exception:
-                        admin_url = ''
-                    body = f"From: {order.email}\nOrder ID: {order.id}\n\n{(text or 'Image attached')}"
-                    if admin_url:
-                        body += f"\n\nOpen chat: {admin_url}"
-                    send_mail(
-                        subject=f"New chat message for Order #{order.id}",
-                        message=body,
-                        from_email=None,
-                        recipient_list=recipients,
-                        fail_silently=True,
-                    )
-            except Exception:
-                pass
-    messages = ChatMessage.objects.filter(order=order).select_related('order')
-    return render(request, 'store/partials/chat_messages.html', {
-        'order': order,
-        'messages': messages,
-        'viewer': 'customer',
-    })
+            with transaction.atomic():
+                msg = ChatMessage(order=order, sender='customer', message=text, is_read=False)
+                if image:
+                    uploads.attach_image(msg, image, request)
+                msg.save()
+                events.record('chat.message', order.id, message=msg.id, sender=msg.sender)
+                # staff get one digest per thread once it goes quiet (flush_chat_notifications)
+                notifications.buffer(msg)
+                customers.open_chat(order.customer_id)
+    return chat_partial(request, order.id, 'customer', {'order': order})
 
 
     
 
 
+@throttle('purchases_request', ('purchases_ip', throttling.client_ip, '10/h'),
+          ('purchases_email', throttling.posted_email, '3/h'))
 def purchases_request(request):
     if request.method == 'POST':
         email = request.POST.get('email', '').strip().lower()
         if email:
-            import secrets
             token = secrets.token_urlsafe(32)
             expires_at = timezone.now() + timezone.timedelta(hours=24)
             EmailAccessLink.objects.create(email=email, token=token, expires_at=expires_at)
             url = request.build_absolute_uri(reverse('purchases_page', args=[token]))
-            send_mail(
+            mail.send_mail(
                 'Your Cheappcgames purchases link',
                 f'Hello,\n\nUse the link below to view all purchases associated with {email}. The link is valid for 24 hours.\n\n{url}\n\nIf you did not request this, you can ignore this email.',
                 None,
                 [email],
+                kind='purchases_link',
                 fail_silently=True,
             )
             return render(request, 'store/purchases_sent.html', {'email': email})
     return render(request, 'store/purchases_request.html')
 
 
+@contains_secrets
 def purchases_page(request, token):
     link = get_object_or_404(EmailAccessLink, token=token)
     if not link.is_valid():
         return render(request, 'store/delivery_expired.html', status=410)
-    orders = Order.objects.filter(email__iexact=link.email).order_by('-created_at')
+    email = customers.normalize_email(link.email)
+    customer = Customer.objects.filter(email=email).first()
+    # orders not linked yet (before backfill_customers ran) still belong to the email
+    unlinked = Q(customer=None, email=email)
+    orders = Order.objects.filter(Q(customer=customer) | unlinked if customer else unlinked).order_by('-created_at')
     # preload related data
-    assignments = {o.id: list(o.offline_assignments.select_related('game').all()) for o in orders}
+    assignments = {o.id: list(o.offline_assignments.select_related('game', 'snapshot').all()) for o in orders}
     for o in orders:
         setattr(o, 'assignments_list', assignments.get(o.id, []))
     return render(request, 'store/purchases_list.html', {
         'link': link,
+        'customer': customer,
         'orders': orders,
     })
+
+
+def metrics_view(request):
+    """Prometheus text exposition behind a bearer token (METRICS_TOKEN).
+
+    Without a token it is only served under DEBUG or when METRICS_PUBLIC opts in.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not (settings.DEBUG or getattr(settings, 'METRICS_PUBLIC', False)):
+            return HttpResponse(status=403)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    response = HttpResponse(
+        metrics.REGISTRY.render(extra=metrics.business_gauges()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+    patch_cache_control(response, no_store=True)
+    return response
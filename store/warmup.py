@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+from django.template import engines
+from django.test import Client
+from django.urls import get_resolver, reverse
+
+from .models import Game, OrderItem
+
+
+# the modules a worker has to import before it can answer its first request
+STARTUP_IMPORT = (
+    'import django; django.setup(); '
+    'import gamestore.urls, store.views, store.admin, django.contrib.admin.sites'
+)
+
+
+def timed(step):
+    started = time.perf_counter()
+    detail = step()
+    return (time.perf_counter() - started) * 1000, detail
+
+
+def import_profile(top=5):
+    """Cold import of the app in a fresh interpreter with -X importtime.
+
+    Returns (total ms, [(module, cumulative ms), ...] for the slowest top-level imports).
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'gamestore.settings')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_IMPORT],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"; top level has no indent
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            modules.append((name.strip(), int(cumulative) / 1000))
+    total = sum(ms for _, ms in modules)
+    return total, sorted(modules, key=lambda m: -m[1])[:top]
+
+
+def open_connections():
+    """Connect every configured database; returns the aliases."""
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return list(connections)
+
+
+def template_names():
+    names = set()
+    for config in settings.TEMPLATES:
+        for directory in config.get('DIRS', []):
+            root = Path(directory)
+            names.update(str(path.relative_to(root)) for path in root.rglob('*.html'))
+    return sorted(names)
+
+
+def compile_templates():
+    """Parse every project template into the cached loader; returns how many."""
+    engine = engines['django']
+    names = template_names()
+    for name in names:
+        engine.get_template(name)
+    return len(names)
+
+
+def top_games(limit):
+    """Best sellers first, topped up with the newest games."""
+    ids = list(
+        OrderItem.objects.values('game').annotate(n=Sum('quantity')).order_by('-n')
+        .values_list('game', flat=True)[:limit]
+    )
+    if len(ids) < limit:
+        ids += Game.objects.exclude(pk__in=ids).order_by('-id').values_list('pk', flat=True)[:limit - len(ids)]
+    return ids
+
+
+def prime_catalog(top=8):
+    """Render the catalog and top detail pages in-process, filling fragment caches and the URLconf."""
+    get_resolver().url_patterns
+    hosts = [h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')]
+    client = Client(SERVER_NAME=hosts[0] if hosts else 'localhost')
+    paths = [reverse('home')] + [reverse('game_detail', args=[pk]) for pk in top_games(top)]
+    failed = [path for path in paths if client.get(path).status_code != 200]
+    return len(paths), failed
+
+
+def shared_cache():
+    """True when the default cache outlives this process, so primed fragments reach other workers."""
+    backend = settings.CACHES['default']['BACKEND']
+    return not backend.endswith(('LocMemCache', 'DummyCache'))
+
+
+def warm(top=8):
+    """In-process warmup for a worker (or a --preload master before it forks). Returns step timings."""
+    try:
+        return [
+            ('database', *timed(open_connections)),
+            ('templates', *timed(compile_templates)),
+            ('catalog', *timed(lambda: prime_catalog(top))),
+        ]
+    finally:
+        # a --preload master must not hand its sockets to forked workers
+        connections.close_all()
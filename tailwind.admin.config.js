@@ -0,0 +1,8 @@
+/** Admin chat build: same theme, without preflight so Django admin styles stay intact. */
+const base = require('./tailwind.config.js');
+
+module.exports = {
+  ...base,
+  content: ['./templates/admin/**/*.html', './templates/store/partials/chat_messages.html'],
+  corePlugins: { preflight: false },
+};
@@ -0,0 +1,15 @@
+/** Tailwind build for the storefront; run via `python manage.py build_assets`. */
+module.exports = {
+  content: ['./templates/**/*.html'],
+  theme: {
+    extend: {
+      colors: {
+        brand: {
+          600: '#2563eb',
+          700: '#1d4ed8',
+        },
+      },
+    },
+  },
+  plugins: [],
+};